@@ -5,9 +5,65 @@ This demonstrates how to automate the Settings navigation for certificate instal
 """
 
 import asyncio
+import functools
+import re
+import shlex
+import subprocess
 import sys
 import time
+import xml.etree.ElementTree as ET
 from pathlib import Path
+from xml.sax.saxutils import escape
+
+try:
+    import uiautomator2 as u2
+except ImportError:  # Optional: fall back to shelling out to `uiautomator dump`
+    u2 = None
+
+# Marker echoed after every command sent to the persistent shell so we know
+# where its output ends; the command's exit status follows it.
+_SENTINEL = b"__END__"
+
+# Bounds of the node whose text attribute matches; formatted per lookup text
+_BOUNDS_TMPL = rb'text="%s"[^>]*bounds="\[(\d+),(\d+)\]\[(\d+),(\d+)\]"'
+
+# Where Android keeps trusted CA files, named <subject_hash_old>.0
+_CA_STORE_DIRS = (
+    "/data/misc/user/0/cacerts-added",
+    "/system/etc/security/cacerts",
+    "/apex/com.android.conscrypt/cacerts",
+)
+
+# From Android 14 (API 34) the Conscrypt APEX store replaces
+# /system/etc/security/cacerts, which is then ignored
+_APEX_CA_SDK = 34
+
+# Dump the UI to a device file and cat it back in the same command: adb
+# exec-out and the PTY-less persistent shell both give a socket as stdout,
+# which /dev/fd/1 can't reopen (ENXIO)
+_UI_DUMP_PATH = "/data/local/tmp/cert_ui.xml"
+_DUMP_UI_SCRIPT = f"uiautomator dump {_UI_DUMP_PATH} >/dev/null && cat {_UI_DUMP_PATH}"
+
+# Scroll swipe length; Settings lists scroll fine with half the old 300 ms
+_SWIPE_DURATION_MS = 150
+
+# Parse: [0,210][1080,394]
+_NODE_BOUNDS_RE = re.compile(r'\[(\d+),(\d+)\]\[(\d+),(\d+)\]')
+
+# Parse: Physical size: 1080x2400
+_SIZE_RE = re.compile(rb'(\d+)x(\d+)')
+
+
+@functools.lru_cache(maxsize=128)
+def _xml_text(text):
+    """Element text encoded and XML-escaped as it appears in a raw dump."""
+    return escape(text, {'"': "&quot;"}).encode()
+
+
+@functools.lru_cache(maxsize=128)
+def _bounds_re(text):
+    """Compiled bounds pattern for an element text."""
+    return re.compile(_BOUNDS_TMPL % re.escape(_xml_text(text)))
 
 
 class CertificateInstaller:
@@ -16,72 +72,277 @@ class CertificateInstaller:
     def __init__(self, adb_path="adb", device_serial=None):
         self.adb_path = adb_path
         self.device_serial = device_serial
+        self._shell = None
+        self._last_dump = None
+        self._screen_size = None
+        self._cert_info = {}
         
-    def run_adb(self, args):
-        """Execute ADB command."""
-        import subprocess
+        # uiautomator2 keeps an agent running on the device, so element
+        # queries avoid spawning a fresh uiautomator dump each time
+        self.d = None
+        if u2 is not None:
+            try:
+                self.d = u2.connect(device_serial)
+            except Exception as e:
+                print(f"uiautomator2 unavailable, using uiautomator dump: {e}")
         
+    def _adb_cmd(self, args):
+        """Build the full adb argv for the selected device."""
         cmd = [self.adb_path]
         if self.device_serial:
             cmd.extend(["-s", self.device_serial])
         cmd.extend(args)
+        return cmd
+    
+    def _get_shell(self):
+        """Return the persistent `adb shell` process, starting it if needed."""
+        if self._shell is None or self._shell.poll() is not None:
+            self._shell = subprocess.Popen(
+                self._adb_cmd(["shell"]),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self._shell
+    
+    def run_shell(self, command):
+        """
+        Run a command in the persistent device shell.
+        
+        Avoids spawning a new adb client (and adb server connection) for
+        every tap and UI poll. Stdout is returned as bytes; stderr is not
+        captured in this mode.
+        """
+        shell = self._get_shell()
+        # printf expands $? before it runs, so this reports the command's status
+        shell.stdin.write(f"{command}; printf '\\n{_SENTINEL.decode()}%d\\n' $?\n".encode())
+        shell.stdin.flush()
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.stdout, result.stderr, result.returncode
+        lines = []
+        while True:
+            line = shell.stdout.readline()
+            if not line:
+                # Shell died; drop it so the next call starts a fresh one
+                self._shell = None
+                return b"".join(lines), "adb shell session closed", 1
+            if line.startswith(_SENTINEL):
+                code = int(line[len(_SENTINEL):].strip() or 1)
+                break
+            lines.append(line)
+        
+        # Drop the newline printf inserted ahead of the sentinel
+        stdout = b"".join(lines)
+        if stdout.endswith(b"\n"):
+            stdout = stdout[:-1]
+        return stdout, "", code
+    
+    def close(self):
+        """Terminate the persistent shell session."""
+        if self._shell is not None and self._shell.poll() is None:
+            self._shell.stdin.close()
+            self._shell.wait()
+        self._shell = None
+    
+    def run_adb(self, args, exec_out=False):
+        """
+        Execute ADB command.
+        
+        Stdout is returned as raw bytes; callers only search it, so it is
+        never decoded. With exec_out=True the command runs via
+        `adb exec-out` (binary-clean stdout, no PTY).
+        """
+        if exec_out:
+            args = ["exec-out", *args]
+        elif args and args[0] == "shell":
+            return self.run_shell(" ".join(args[1:]))
+        
+        result = subprocess.run(self._adb_cmd(args), capture_output=True)
+        return result.stdout, result.stderr.decode(errors="replace"), result.returncode
+    
+    def run_adb_script(self, script):
+        """Run several `;`-separated shell commands in a single adb round-trip."""
+        return self.run_adb(["shell", script])
+    
+    def dump_ui(self):
+        """Dump the current UI hierarchy as raw XML bytes."""
+        if self.d is not None:
+            return self.d.dump_hierarchy().encode()
+        
+        stdout, _, _ = self.run_adb([_DUMP_UI_SCRIPT], exec_out=True)
+        return stdout
+    
+    def run_and_dump(self, script):
+        """Run a shell script, then dump the UI, in one round-trip when possible."""
+        if self.d is not None:
+            # uiautomator2 holds the UiAutomation connection, so a raw
+            # `uiautomator dump` would fail; ask it for the dump instead
+            self.run_adb_script(script)
+            return self.dump_ui()
+        
+        stdout, _, _ = self.run_adb_script(f"{script}; {_DUMP_UI_SCRIPT}")
+        return stdout
+    
+    def _parse_dump(self, xml):
+        """Map every element text in a UI dump to its (x1, y1, x2, y2) bounds."""
+        key = hash(xml)
+        if self._last_dump is not None and self._last_dump[0] == key:
+            return self._last_dump[1]
+        
+        table = {}
+        # uiautomator appends a status line after the closing tag
+        start = max(xml.find(b"<?xml"), 0)
+        end = xml.rfind(b">") + 1
+        try:
+            root = ET.fromstring(xml[start:end])
+        except ET.ParseError:
+            root = None
+        
+        if root is not None:
+            for node in root.iter("node"):
+                text = node.get("text")
+                match = _NODE_BOUNDS_RE.match(node.get("bounds", ""))
+                if text and match:
+                    # First match wins, as with a top-down search
+                    table.setdefault(text, tuple(map(int, match.groups())))
+        
+        self._last_dump = (key, table)
+        return table
+    
+    def _lookup_bounds(self, dump, text):
+        """Bounds of the element with the given text in a dump, or None."""
+        # Cheap substring test first: most polls miss, and those skip parsing
+        if _xml_text(text) not in dump:
+            return None
+        
+        table = self._parse_dump(dump)
+        if table:
+            return table.get(text)
+        
+        # Dump was not parseable XML; fall back to scanning it
+        match = _bounds_re(text).search(dump)
+        return tuple(map(int, match.groups())) if match else None
     
     def wait_for_ui(self, text, timeout=10):
-        """Wait for UI element with text to appear."""
-        start = time.time()
-        while time.time() - start < timeout:
-            stdout, _, _ = self.run_adb(["shell", "uiautomator", "dump", "/dev/tty"])
-            if text in stdout:
-                return True
-            time.sleep(0.5)
-        return False
+        """
+        Wait for UI element with text to appear.
+        
+        Checks immediately, then polls with a delay that starts at 50 ms and
+        backs off to 500 ms, so settled screens return after one dump.
+        Returns the dump that contained the element, or None on timeout.
+        """
+        if self.d is not None:
+            if self.d(text=text).wait(timeout=timeout):
+                return self.dump_ui()
+            return None
+        
+        _, dump = self._wait_for_any((text,), timeout)
+        return dump
     
-    def find_element_bounds(self, text):
-        """Find bounds of element with given text."""
-        stdout, _, _ = self.run_adb(["shell", "uiautomator", "dump", "/dev/tty"])
+    def _wait_for_any(self, texts, timeout):
+        """
+        Poll dumps until any of texts appears; return (text, dump).
         
-        # Parse bounds from dump
-        import re
-        pattern = rf'text="{re.escape(text)}"[^>]*bounds="\[(\d+),(\d+)\]\[(\d+),(\d+)\]"'
-        match = re.search(pattern, stdout)
+        Every candidate is checked against the same dump, so looking for
+        alternatives costs no extra dumps. Returns (None, None) on timeout.
+        """
+        deadline = time.time() + timeout
+        delay = 0.05
+        while True:
+            dump = self.dump_ui()
+            for text in texts:
+                if self._lookup_bounds(dump, text):
+                    return text, dump
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None, None
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, 0.5)
+    
+    def _find_in_dump(self, dump, text):
+        """Center of the element with given text in an already-fetched dump."""
+        bounds = self._lookup_bounds(dump, text)
         
-        if match:
-            x1, y1, x2, y2 = map(int, match.groups())
+        if bounds:
+            x1, y1, x2, y2 = bounds
             center_x = (x1 + x2) // 2
             center_y = (y1 + y2) // 2
             return center_x, center_y
         return None
     
+    def find_element_bounds(self, text, dump=None):
+        """Find bounds of element with given text, optionally in an existing dump."""
+        if dump is None:
+            dump = self.dump_ui()
+        return self._find_in_dump(dump, text)
+    
     def tap(self, x, y):
         """Tap at coordinates."""
-        self.run_adb(["shell", "input", "tap", str(x), str(y)])
-        time.sleep(0.5)
+        self.run_adb(["shell", "input", "touchscreen", "tap", str(x), str(y)])
     
     def tap_text(self, text, timeout=10):
         """Find and tap element with text."""
-        if not self.wait_for_ui(text, timeout):
+        if self.d is not None:
+            element = self.d(text=text)
+            if not element.wait(timeout=timeout):
+                print(f"Could not find element with text: {text}")
+                return False
+            element.click()
+            return True
+        
+        dump = self.wait_for_ui(text, timeout)
+        if dump is None:
             print(f"Could not find element with text: {text}")
             return False
         
-        coords = self.find_element_bounds(text)
+        # The dump that proved the element present already holds its bounds
+        coords = self._find_in_dump(dump, text)
         if coords:
             self.tap(*coords)
             return True
         return False
     
+    def tap_any(self, texts, timeout=5, scrolls=3, scroll_timeout=2):
+        """
+        Tap the first of several alternative texts, scrolling until found.
+        
+        Waits up to timeout for the screen to show any candidate, then
+        scrolls and rechecks (up to scroll_timeout each) up to scrolls times.
+        """
+        for attempt in range(scrolls):
+            text, dump = self._wait_for_any(texts, timeout if attempt == 0 else scroll_timeout)
+            if dump is not None:
+                self.tap(*self._find_in_dump(dump, text))
+                return True
+            self.scroll_down()
+        return False
+    
+    def tap_and_wait(self, text_to_tap, next_text, timeout=10, next_timeout=None):
+        """
+        Tap element with text, then wait for the screen it leads to.
+        
+        Gates on the next expected text instead of sleeping a fixed time.
+        next_timeout (default: timeout) bounds the wait for next_text, so an
+        optional screen can be given up on quickly.
+        Returns the dump containing next_text, or None.
+        """
+        if not self.tap_text(text_to_tap, timeout):
+            return None
+        return self.wait_for_ui(next_text, timeout if next_timeout is None else next_timeout)
+    
+    def screen_size(self):
+        """Screen (width, height), queried once per installer instance."""
+        if self._screen_size is None:
+            stdout, _, _ = self.run_adb(["shell", "wm", "size"])
+            match = _SIZE_RE.search(stdout)
+            if match:
+                self._screen_size = (int(match.group(1)), int(match.group(2)))
+        return self._screen_size
+    
     def scroll_down(self):
         """Scroll down in current view."""
-        # Get screen size
-        stdout, _, _ = self.run_adb(["shell", "wm", "size"])
-        # Parse: Physical size: 1080x2400
-        import re
-        match = re.search(r'(\d+)x(\d+)', stdout)
-        if match:
-            width = int(match.group(1))
-            height = int(match.group(2))
+        size = self.screen_size()
+        if size:
+            width, height = size
             
             # Swipe from bottom to top
             start_x = width // 2
@@ -89,131 +350,281 @@ class CertificateInstaller:
             end_y = int(height * 0.2)
             
             self.run_adb([
-                "shell", "input", "swipe",
+                "shell", "input", "touchscreen", "swipe",
                 str(start_x), str(start_y),
                 str(start_x), str(end_y),
-                "300"
+                str(_SWIPE_DURATION_MS)
             ])
             time.sleep(0.5)
     
-    def install_certificate(self, cert_path, cert_name="mitmproxy-ca"):
+    async def _run_host_async(self, cmd, input=None, text=True):
+        """Run a host command without blocking the event loop."""
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stdout, stderr = await proc.communicate(input)
+        if text:
+            stdout = stdout.decode(errors="replace")
+        return stdout, stderr.decode(errors="replace"), proc.returncode
+    
+    async def _push_bytes(self, data, remote_path):
         """
-        Automated certificate installation workflow.
+        Write in-memory data to a device file, no local file.
         
-        Args:
-            cert_path: Local path to certificate file (.pem or .crt)
-            cert_name: Name to give the certificate
+        Runs over `adb shell` rather than `exec-in`, which exits 0 whatever
+        happens to the remote `cat`; shell_v2 reports its exit status, and
+        the size check fails the command on a short or missing write.
         """
-        print("Starting automated certificate installation...")
-        
-        # Step 1: Convert certificate to DER format if needed
+        path = shlex.quote(remote_path)
+        return await self._run_host_async(
+            self._adb_cmd(["shell", f'cat > {path} && [ "$(wc -c < {path})" -eq {len(data)} ]']),
+            input=data,
+        )
+    
+    async def _convert_and_push(self, cert_path, remote_path):
+        """Convert the certificate to DER if needed and push it to the device."""
+        # Step 1: Convert certificate to DER format if needed. openssl writes
+        # DER to stdout and it is streamed to the device, so no .crt file is
+        # left next to the input (which may be in a read-only directory).
+        der = None
         if cert_path.endswith('.pem'):
             print("Converting PEM to DER format...")
-            import subprocess
-            der_path = cert_path.replace('.pem', '.crt')
-            result = subprocess.run([
+            stdout, _, code = await self._run_host_async([
                 'openssl', 'x509',
                 '-inform', 'PEM',
                 '-in', cert_path,
-                '-outform', 'DER',
-                '-out', der_path
-            ], capture_output=True)
+                '-outform', 'DER'
+            ], text=False)
             
-            if result.returncode == 0:
-                cert_path = der_path
-                print(f"Converted to: {der_path}")
+            if code == 0:
+                der = stdout
             else:
                 print("Warning: Could not convert certificate format")
         
         # Step 2: Push certificate to device
         print("Pushing certificate to device...")
-        remote_path = f"/sdcard/Download/{cert_name}.crt"
-        stdout, stderr, code = self.run_adb(["push", cert_path, remote_path])
+        if der is not None:
+            _, stderr, code = await self._push_bytes(der, remote_path)
+        else:
+            _, stderr, code = await self._run_host_async(
+                self._adb_cmd(["push", cert_path, remote_path])
+            )
         
         if code != 0:
             print(f"Error pushing certificate: {stderr}")
             return False
         
         print(f"Certificate pushed to: {remote_path}")
+        return True
+    
+    async def _cert_hash_and_pem(self, cert_path):
+        """
+        Return (subject_hash_old, PEM text) for a certificate, or (None, None).
+        
+        Android names CA store entries after the old-style subject hash.
+        """
+        if cert_path in self._cert_info:
+            return self._cert_info[cert_path]
+        
+        for inform in ("PEM", "DER"):
+            stdout, _, code = await self._run_host_async([
+                'openssl', 'x509',
+                '-inform', inform,
+                '-subject_hash_old',
+                '-in', cert_path
+            ])
+            if code == 0:
+                # openssl prints the hash line followed by the PEM certificate
+                cert_hash, _, pem = stdout.partition("\n")
+                self._cert_info[cert_path] = (cert_hash.strip(), pem)
+                return self._cert_info[cert_path]
+        return None, None
+    
+    def is_certificate_installed(self, cert_hash):
+        """
+        Probe the device CA stores for <cert_hash>.0 in one round-trip.
+        
+        Returns True if found, False if not, or None when the user CA store
+        cannot be read (non-root shells) and a user install can't be ruled out.
+        """
+        dirs = " ".join(_CA_STORE_DIRS)
+        # A copy under /system doesn't count where the OS ignores that store
+        stdout, _, _ = self.run_adb_script(
+            f'for d in {dirs}; do '
+            f'[ "$d" = {_CA_STORE_DIRS[1]} ] && [ "$(getprop ro.build.version.sdk)" -ge {_APEX_CA_SDK} ] && continue; '
+            f'[ -e "$d/{cert_hash}.0" ] && {{ echo present; break; }}; done; '
+            f'[ -x {_CA_STORE_DIRS[0]} ] || echo unreadable'
+        )
+        if b"present" in stdout:
+            return True
+        if b"unreadable" in stdout:
+            return None
+        return False
+    
+    async def install_certificate_rooted(self, cert_path):
+        """
+        Install the certificate straight into the system CA store.
+        
+        Only works where adbd can run as root (e.g. non-Play emulator images),
+        /system can be remounted and the device predates Android 14, whose
+        APEX CA store ignores /system. Reboots the device on success.
+        Returns False, without changing anything, if the device doesn't qualify.
+        """
+        cert_hash, pem = await self._cert_hash_and_pem(cert_path)
+        if not cert_hash:
+            print("Warning: Could not read certificate hash")
+            return False
+        
+        stdout, _, _ = await asyncio.to_thread(self.run_shell, "getprop ro.build.version.sdk")
+        sdk = stdout.strip()
+        if not sdk.isdigit():
+            print("Could not read the Android version, skipping the system certificate install")
+            return False
+        if int(sdk) >= _APEX_CA_SDK:
+            print("Android 14+ ignores /system/etc/security/cacerts, skipping the system certificate install")
+            return False
+        
+        # Restarting adbd as root kills the persistent shell session
+        self.close()
+        stdout, stderr, code = await self._run_host_async(self._adb_cmd(["root"]))
+        if code != 0 or "cannot run as root" in stdout + stderr:
+            return False
+        await self._run_host_async(self._adb_cmd(["wait-for-device"]))
+        
+        print("Root available: installing as a system certificate (the device will reboot)")
+        print("Remounting /system...")
+        stdout, stderr, code = await self._run_host_async(self._adb_cmd(["remount"]))
+        if code != 0:
+            print(f"Could not remount /system: {stderr or stdout}")
+            return False
+        
+        remote_path = f"/system/etc/security/cacerts/{cert_hash}.0"
+        print(f"Installing system certificate: {remote_path}")
+        _, stderr, code = await self._push_bytes(pem.encode(), remote_path)
+        if code != 0:
+            print(f"Error pushing certificate: {stderr}")
+            return False
+        
+        # /system can stay read-only after remount on newer emulators; make
+        # sure the file really landed before rebooting for it
+        path = shlex.quote(remote_path)
+        _, _, code = await asyncio.to_thread(self.run_shell, f"chmod 644 {path} && [ -s {path} ]")
+        if code != 0:
+            print(f"Could not write {remote_path}")
+            return False
+        
+        print("Rebooting the device to reload the system certificate store...")
+        await self._run_host_async(self._adb_cmd(["reboot"]))
+        return True
+    
+    async def install_certificate(self, cert_path, cert_name="mitmproxy-ca"):
+        """
+        Automated certificate installation workflow.
+        
+        Tries a direct system store install first and falls back to
+        driving the Settings UI on devices without root.
+        
+        Args:
+            cert_path: Local path to certificate file (.pem or .crt)
+            cert_name: Name to give the certificate
+        """
+        print("Starting automated certificate installation...")
+        
+        cert_hash, _ = await self._cert_hash_and_pem(cert_path)
+        if cert_hash and await asyncio.to_thread(self.is_certificate_installed, cert_hash):
+            print(f"✓ Certificate {cert_hash}.0 is already trusted on the device")
+            return True
+        
+        # Rooted emulators can skip the whole Settings UI flow
+        if await self.install_certificate_rooted(cert_path):
+            print("✓ Certificate installed as a system certificate! The device is rebooting to load it.")
+            return True
+        print("System install unavailable, installing through Settings...")
+        
+        remote_path = f"/sdcard/Download/{cert_name}.crt"
         
-        # Step 3: Open Settings app
+        # Steps 1-3: The certificate file is not needed until Step 10, so
+        # convert and push it while Settings opens. Settings is opened and
+        # its first screen dumped in one round-trip.
         print("Opening Settings...")
-        self.run_adb(["shell", "am", "start", "-a", "android.settings.SETTINGS"])
-        time.sleep(2)
+        pushed, dump = await asyncio.gather(
+            self._convert_and_push(cert_path, remote_path),
+            asyncio.to_thread(self.run_and_dump, "am start -W -a android.settings.SETTINGS"),
+        )
+        
+        if not pushed:
+            return False
         
         # Step 4: Navigate to Security settings
         print("Navigating to Security...")
         
         # Search for "Security" or "Biometrics and security"
-        if not self.tap_text("Security", timeout=5):
+        coords = self.find_element_bounds("Security", dump=dump)
+        if coords:
+            self.tap(*coords)
+        elif not self.tap_text("Security", timeout=5):
             self.tap_text("Biometrics and security", timeout=5)
         
-        time.sleep(1)
-        
         # Step 5: Find "Encryption & credentials" or similar
         print("Looking for credential settings...")
         
-        # May need to scroll to find it
-        for _ in range(3):
-            if self.tap_text("Encryption & credentials"):
-                break
-            if self.tap_text("Credential storage"):
-                break
-            self.scroll_down()
-        
-        time.sleep(1)
+        # May need to scroll to find it. tap_any polls until the new
+        # screen shows up, so no fixed sleeps are needed between steps.
+        self.tap_any(("Encryption & credentials", "Credential storage"))
         
         # Step 6: Select "Install a certificate"
         print("Selecting certificate installation...")
         
-        for _ in range(3):
-            if self.tap_text("Install a certificate"):
-                break
-            if self.tap_text("Install from SD card"):
-                break
-            if self.tap_text("Install from storage"):
-                break
-            self.scroll_down()
-        
-        time.sleep(1)
+        self.tap_any(("Install a certificate", "Install from SD card", "Install from storage"))
         
         # Step 7: Select CA certificate type
         print("Selecting CA certificate...")
-        self.tap_text("CA certificate")
-        time.sleep(1)
         
         # Step 8: Handle "Install anyway" warning if present
-        if self.wait_for_ui("Install anyway", timeout=3):
+        if self.tap_and_wait("CA certificate", "Install anyway", next_timeout=3):
             print("Confirming certificate installation warning...")
             self.tap_text("Install anyway")
-            time.sleep(1)
         
         # Step 9: Navigate to Downloads folder
         print("Navigating to certificate file...")
         
-        # Tap the menu icon to show navigation drawer
-        self.tap(50, 150)  # Top-left menu icon (approximate)
-        time.sleep(1)
+        # Tap the menu icon to show navigation drawer, then dump the drawer
+        # Top-left menu icon (approximate)
+        dump = self.run_and_dump("input touchscreen tap 50 150")
         
-        if self.tap_text("Downloads"):
-            time.sleep(1)
+        coords = self.find_element_bounds("Downloads", dump=dump)
+        if coords:
+            self.tap(*coords)
+        else:
+            self.tap_text("Downloads")
         
         # Step 10: Select the certificate file
         print(f"Selecting certificate: {cert_name}.crt...")
         if self.tap_text(f"{cert_name}.crt"):
-            time.sleep(1)
-            
-            # Step 11: Name the certificate
+            # Step 11: Name the certificate once the naming dialog is up
             print("Naming certificate...")
-            self.run_adb(["shell", "input", "text", cert_name.replace(" ", "%s")])
-            time.sleep(0.5)
-            
-            # Step 12: Confirm installation
+            self.wait_for_ui("OK", timeout=5)
+            # Step 12: Confirm installation (dump taken in the same round-trip)
+            dump = self.run_and_dump(f"input text {cert_name.replace(' ', '%s')}")
             print("Confirming installation...")
-            self.tap_text("OK")
-            time.sleep(1)
+            coords = self.find_element_bounds("OK", dump=dump)
+            if coords:
+                self.tap(*coords)
+            else:
+                self.tap_text("OK")
             
-            print("✓ Certificate installation complete!")
+            # Step 13: Verify the certificate landed in the user CA store
+            installed = self.is_certificate_installed(cert_hash) if cert_hash else None
+            if installed is False:
+                print("✗ Certificate not found in the device CA store")
+                return False
+            if installed is None:
+                print("✓ Certificate installation complete (could not verify on device)")
+            else:
+                print("✓ Certificate installation complete!")
             return True
         else:
             print("✗ Could not find certificate file")
@@ -238,7 +649,10 @@ def main():
     
     installer = CertificateInstaller(device_serial=device_serial)
     
-    success = installer.install_certificate(cert_path)
+    try:
+        success = asyncio.run(installer.install_certificate(cert_path))
+    finally:
+        installer.close()
     
     if success:
         print("\n" + "="*50)
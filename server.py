@@ -5,15 +5,22 @@ Provides tools for Claude to interact with Android emulators like a human would.
 """
 
 import asyncio
-import base64
+import binascii
+import io
 import json
 import logging
 import os
+import posixpath
+import secrets
+import shlex
+import shutil
+import stat
+import struct
 import subprocess
 import time
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -24,10 +31,622 @@ from mcp.types import (
     EmbeddedResource,
 )
 
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("android-emulator-mcp")
 
+# Prefix of the marker ending a command's output on the persistent shell;
+# each session appends a random token so command output can't fake it. On
+# stdout the command's exit status follows it
+_SHELL_SENTINEL = b"__END__"
+
+# Longest possible trailer after the sentinel: exit status digits + newline
+_SHELL_TRAILER_MAX = 8
+
+# shell_v2 packet ids (system/core/adb/shell_protocol.h)
+_SHELL_STDIN = 0
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+_SHELL_EXIT = 3
+
+# Max payload of a sync DATA packet
+_SYNC_CHUNK = 64 * 1024
+
+# Where a discovered adb path is remembered between runs, under XDG_CACHE_HOME
+_ADB_CACHE_FILE = Path("android-mcp-emulator", "adb_path")
+
+# ADBKeyBoard IME: takes whole strings by broadcast, including non-ASCII
+# text that `input text` cannot type
+_ADB_KEYBOARD_IME = "com.android.adbkeyboard/.AdbIME"
+
+# Texts longer than this go through ADBKeyBoard when it is the active IME,
+# since `input text` injects one key event per character
+_ADB_KEYBOARD_MIN_LENGTH = 30
+
+# press_key names -> Android keycodes
+_KEY_CODES = {
+    "back": "4",
+    "home": "3",
+    "recent": "187",
+    "menu": "82",
+    "power": "26",
+    "volume_up": "24",
+    "volume_down": "25",
+}
+
+# How long an empty device listing short-circuits device commands, in seconds
+_NO_DEVICES_TTL = 2
+
+# How long wait_for_idle waits for the focus to move before concluding the
+# last action didn't open a new window, in seconds
+_IDLE_NO_CHANGE_S = 1.0
+
+# How long a pm list packages result is reused, in seconds
+_PKG_CACHE_TTL = 30
+
+# Device file UI dumps are written to, then read back with cat in the same
+# command: exec/raw stdout is a socket, which /dev/fd/1 can't reopen (ENXIO)
+_UI_DUMP_PATH = "/data/local/tmp/mcp_ui.xml"
+
+# Largest file install_certificate will push; PEM/DER CA certs are a few KB
+_CERT_MAX_SIZE = 64 * 1024
+
+# Build properties reported by get_device_info, read in one getprop script
+_DEVICE_PROPERTIES = (
+    "ro.product.model",
+    "ro.build.version.release",
+    "ro.build.version.sdk",
+    "ro.product.cpu.abi",
+)
+_DEVICE_INFO_SCRIPT = "; echo ---; ".join(f"getprop {prop}" for prop in _DEVICE_PROPERTIES)
+
+# find_element/tap_element criteria keys and the dump attribute each matches
+_CRITERIA_ATTRS = {
+    "text": "text",
+    "resource_id": "resource-id",
+    "class_name": "class",
+    "content_desc": "content-desc",
+}
+
+
+class AdbError(Exception):
+    """Raised when the adb server or device rejects a request."""
+
+
+class AdbClient:
+    """
+    Minimal asyncio client for the adb server's smart-socket protocol.
+    
+    Talks to the local adb server directly over TCP instead of forking the
+    adb CLI for every command. See SERVICES.TXT and SYNC.TXT in the adb
+    sources for the wire format.
+    """
+    
+    def __init__(self, adb_path: str = "adb"):
+        self.adb_path = adb_path
+        self.host = "127.0.0.1"
+        self.port = int(os.environ.get("ANDROID_ADB_SERVER_PORT", 5037))
+        
+        # Last device listing as (time fetched, serials of online devices)
+        self._devices_cache: Tuple[float, List[str]] = (0.0, [])
+    
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Connect to the adb server, starting it first if it isn't running."""
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except ConnectionRefusedError:
+            # Same as the adb CLI: launch the server on demand
+            proc = await asyncio.create_subprocess_exec(
+                self.adb_path, "start-server",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            await proc.wait()
+            return await asyncio.open_connection(self.host, self.port)
+    
+    @staticmethod
+    async def _read_message(reader: asyncio.StreamReader) -> str:
+        """Read a hex-length-prefixed string."""
+        length = int(await reader.readexactly(4), 16)
+        return (await reader.readexactly(length)).decode(errors="replace")
+    
+    async def _send_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, service: str):
+        """Send a service request and check the OKAY/FAIL status."""
+        data = service.encode()
+        writer.write(b"%04x%s" % (len(data), data))
+        await writer.drain()
+        
+        status = await reader.readexactly(4)
+        if status == b"FAIL":
+            raise AdbError(await self._read_message(reader))
+        if status != b"OKAY":
+            raise AdbError(f"Unexpected response from adb server: {status!r}")
+    
+    def no_devices(self) -> bool:
+        """True while the most recent device listing, if still fresh, found nothing online."""
+        fetched, serials = self._devices_cache
+        return not serials and time.monotonic() - fetched < _NO_DEVICES_TTL
+    
+    async def _open(self, service: str, serial: Optional[str] = None) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open a connection to a host service, or to a device service when serial is given."""
+        # Every device service comes through here, so this one check spares
+        # all of them the server round-trip when nothing is connected
+        if not service.startswith("host:") and self.no_devices():
+            raise AdbError("No devices connected.")
+        
+        reader, writer = await self._connect()
+        try:
+            if not service.startswith("host:"):
+                transport = f"host:transport:{serial}" if serial else "host:transport-any"
+                await self._send_request(reader, writer, transport)
+            await self._send_request(reader, writer, service)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+    
+    async def devices(self) -> List[Tuple[str, str, str]]:
+        """List (serial, state, extra info) for every device the server knows about."""
+        reader, writer = await self._open("host:devices-l")
+        try:
+            listing = await self._read_message(reader)
+        finally:
+            writer.close()
+        
+        devices = []
+        for line in listing.splitlines():
+            parts = line.split(None, 2)
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1], parts[2] if len(parts) > 2 else ""))
+        
+        self._devices_cache = (time.monotonic(), [serial for serial, state, _ in devices if state == "device"])
+        return devices
+    
+    async def open_shell(self, serial: Optional[str]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open an interactive shell_v2 session without a PTY (`adb shell -T`)."""
+        return await self._open("shell,v2,raw:", serial)
+    
+    async def shell(self, serial: Optional[str], command: str) -> Tuple[str, str, int]:
+        """Run one command on its own shell_v2 connection and return stdout, stderr, exit code."""
+        reader, writer = await self._open(f"shell,v2,raw:{command}", serial)
+        try:
+            stdout, stderr = bytearray(), bytearray()
+            while True:
+                packet_id, payload = await self.read_shell_packet(reader)
+                if packet_id == _SHELL_STDOUT:
+                    stdout += payload
+                elif packet_id == _SHELL_STDERR:
+                    stderr += payload
+                elif packet_id == _SHELL_EXIT:
+                    return stdout.decode(errors="replace"), stderr.decode(errors="replace"), payload[0]
+        finally:
+            writer.close()
+    
+    async def exec_out(self, serial: Optional[str], command: str) -> bytes:
+        """Run a command with raw binary stdout (`adb exec-out`) and return its output."""
+        reader, writer = await self._open(f"exec:{command}", serial)
+        try:
+            return await reader.read()
+        finally:
+            writer.close()
+    
+    @staticmethod
+    def shell_packet(packet_id: int, payload: bytes = b"") -> bytes:
+        """Frame a shell_v2 packet."""
+        return struct.pack("<BI", packet_id, len(payload)) + payload
+    
+    @staticmethod
+    async def read_shell_packet(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        """Read one shell_v2 packet as (packet id, payload)."""
+        packet_id, length = struct.unpack("<BI", await reader.readexactly(5))
+        return packet_id, await reader.readexactly(length)
+    
+    @staticmethod
+    async def _read_sync_status(reader: asyncio.StreamReader) -> Tuple[bytes, int]:
+        """Read a sync response header as (id, length/argument)."""
+        return struct.unpack("<4sI", await reader.readexactly(8))
+    
+    @staticmethod
+    def _sync_request(request_id: bytes, path: str) -> bytes:
+        data = path.encode()
+        return request_id + struct.pack("<I", len(data)) + data
+    
+    async def _sync_is_dir(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str) -> bool:
+        """True if path is a directory, or a symlink to one, on the device."""
+        writer.write(self._sync_request(b"STAT", path))
+        await writer.drain()
+        _, mode, _, _ = struct.unpack("<4sIII", await reader.readexactly(16))
+        if stat.S_ISLNK(mode) and not path.endswith("/"):
+            # STAT is lstat; as the CLI does, a trailing slash resolves the
+            # link (e.g. /sdcard -> /storage/self/primary)
+            return await self._sync_is_dir(reader, writer, path + "/")
+        return stat.S_ISDIR(mode)
+    
+    async def pull(self, serial: Optional[str], remote_path: str, local_path: str) -> int:
+        """Copy a device file to the host; returns the number of bytes received."""
+        if os.path.isdir(local_path):
+            local_path = os.path.join(local_path, posixpath.basename(remote_path))
+        
+        reader, writer = await self._open("sync:", serial)
+        f = None
+        total = 0
+        done = False
+        try:
+            writer.write(self._sync_request(b"RECV", remote_path))
+            await writer.drain()
+            
+            while True:
+                status, length = await self._read_sync_status(reader)
+                if status == b"DATA":
+                    data = await reader.readexactly(length)
+                    # Create the file only once the device has sent something,
+                    # so a failed RECV doesn't leave an empty file behind
+                    if f is None:
+                        f = await asyncio.to_thread(open, local_path, "wb")
+                    await asyncio.to_thread(f.write, data)
+                    total += length
+                elif status == b"DONE":
+                    break
+                elif status == b"FAIL":
+                    raise AdbError((await reader.readexactly(length)).decode(errors="replace"))
+                else:
+                    raise AdbError(f"Unexpected sync response: {status!r}")
+            
+            if f is None:
+                # Empty remote file
+                f = await asyncio.to_thread(open, local_path, "wb")
+            writer.write(self._sync_request(b"QUIT", ""))
+            done = True
+        finally:
+            writer.close()
+            if f is not None:
+                f.close()
+                if not done:
+                    # Don't leave a truncated copy behind
+                    os.unlink(local_path)
+        return total
+    
+    async def push(self, serial: Optional[str], local_path: str, remote_path: str) -> int:
+        """Copy a host file to the device; returns the number of bytes sent."""
+        # Opening first surfaces a missing local file before touching the device
+        with open(local_path, "rb") as f:
+            mode = os.fstat(f.fileno()).st_mode & 0o777
+            
+            reader, writer = await self._open("sync:", serial)
+            try:
+                # Like the CLI, pushing into a directory keeps the file name
+                if await self._sync_is_dir(reader, writer, remote_path):
+                    remote_path = posixpath.join(remote_path, os.path.basename(local_path))
+                
+                writer.write(self._sync_request(b"SEND", f"{remote_path},{mode}"))
+                total = 0
+                while chunk := await asyncio.to_thread(f.read, _SYNC_CHUNK):
+                    writer.write(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                    await writer.drain()
+                    total += len(chunk)
+                writer.write(b"DONE" + struct.pack("<I", int(time.time())))
+                await writer.drain()
+                
+                status, length = await self._read_sync_status(reader)
+                if status != b"OKAY":
+                    raise AdbError((await reader.readexactly(length)).decode(errors="replace"))
+                
+                writer.write(self._sync_request(b"QUIT", ""))
+            finally:
+                writer.close()
+        return total
+
+
+# Tool definitions served by list_tools; built once at import
+_TOOLS: Tuple[Tool, ...] = (
+    # Device Management
+    Tool(
+        name="list_devices",
+        description="List all available Android devices and emulators",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        }
+    ),
+    Tool(
+        name="select_device",
+        description="Select a specific device/emulator to interact with",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "serial": {
+                    "type": "string",
+                    "description": "Device serial number (e.g., emulator-5554)"
+                }
+            },
+            "required": ["serial"]
+        }
+    ),
+    Tool(
+        name="get_device_info",
+        description="Get detailed information about the current device",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        }
+    ),
+    
+    # Screen Inspection
+    Tool(
+        name="capture_screenshot",
+        description="Capture a screenshot of the current screen",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "save_path": {
+                    "type": "string",
+                    "description": "Optional path to save screenshot locally"
+                }
+            }
+        }
+    ),
+    Tool(
+        name="get_ui_hierarchy",
+        description="Get the XML hierarchy of the current screen UI",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        }
+    ),
+    Tool(
+        name="find_element",
+        description="Find UI element by text, resource-id, or other attributes",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {"type": "string", "description": "Element text"},
+                "resource_id": {"type": "string", "description": "Resource ID"},
+                "class_name": {"type": "string", "description": "Class name"},
+                "content_desc": {"type": "string", "description": "Content description"}
+            }
+        }
+    ),
+    
+    # UI Interaction
+    Tool(
+        name="tap_coordinates",
+        description="Tap at specific screen coordinates",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "x": {"type": "number", "description": "X coordinate"},
+                "y": {"type": "number", "description": "Y coordinate"},
+                "settle_ms": {"type": "number", "description": "Time to wait afterwards for the UI to settle, in ms", "default": 0}
+            },
+            "required": ["x", "y"]
+        }
+    ),
+    Tool(
+        name="tap_element",
+        description="Tap on a UI element by finding it first",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {"type": "string", "description": "Element text"},
+                "resource_id": {"type": "string", "description": "Resource ID"},
+                "content_desc": {"type": "string", "description": "Content description"}
+            }
+        }
+    ),
+    Tool(
+        name="swipe",
+        description="Perform a swipe gesture",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "start_x": {"type": "number"},
+                "start_y": {"type": "number"},
+                "end_x": {"type": "number"},
+                "end_y": {"type": "number"},
+                "duration": {"type": "number", "description": "Duration in ms", "default": 300},
+                "settle_ms": {"type": "number", "description": "Time to wait afterwards for the UI to settle, in ms", "default": 0}
+            },
+            "required": ["start_x", "start_y", "end_x", "end_y"]
+        }
+    ),
+    Tool(
+        name="input_text",
+        description="Input text into the currently focused field",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "text": {"type": "string", "description": "Text to input"}
+            },
+            "required": ["text"]
+        }
+    ),
+    Tool(
+        name="press_key",
+        description="Press a system key (back, home, recent, etc.)",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "key": {
+                    "type": "string",
+                    "enum": list(_KEY_CODES),
+                    "description": "Key to press"
+                },
+                "settle_ms": {"type": "number", "description": "Time to wait afterwards for the UI to settle, in ms", "default": 0}
+            },
+            "required": ["key"]
+        }
+    ),
+    Tool(
+        name="wait_for_idle",
+        description="Wait for the focused window to change and settle, e.g. after a tap that opens a screen; returns early if focus hasn't moved within 1 s",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "timeout_ms": {"type": "number", "description": "Maximum time to wait in ms", "default": 5000}
+            }
+        }
+    ),
+    Tool(
+        name="batch_actions",
+        description="Run a sequence of input actions in a single device round-trip",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "actions": {
+                    "type": "array",
+                    "description": "Actions to run in order; the batch stops at the first failure",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "action": {
+                                "type": "string",
+                                "enum": ["tap", "swipe", "input_text", "press_key", "sleep"],
+                            },
+                            "args": {
+                                "type": "object",
+                                "description": "tap: x, y; swipe: start_x, start_y, end_x, end_y, duration; input_text: text; press_key: key; sleep: ms",
+                            },
+                        },
+                        "required": ["action"]
+                    }
+                }
+            },
+            "required": ["actions"]
+        }
+    ),
+    
+    # App Management
+    Tool(
+        name="install_app",
+        description="Install an APK on the device",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "apk_path": {"type": "string", "description": "Path to APK file"}
+            },
+            "required": ["apk_path"]
+        }
+    ),
+    Tool(
+        name="launch_app",
+        description="Launch an app by package name",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "package": {"type": "string", "description": "Package name (e.g., com.android.settings)"}
+            },
+            "required": ["package"]
+        }
+    ),
+    Tool(
+        name="stop_app",
+        description="Force stop an app",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "package": {"type": "string", "description": "Package name"}
+            },
+            "required": ["package"]
+        }
+    ),
+    Tool(
+        name="clear_app_data",
+        description="Clear app data and cache",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "package": {"type": "string", "description": "Package name"}
+            },
+            "required": ["package"]
+        }
+    ),
+    Tool(
+        name="list_packages",
+        description="List installed packages",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "filter": {"type": "string", "description": "Optional filter string"}
+            }
+        }
+    ),
+    
+    # Network Configuration
+    Tool(
+        name="setup_proxy",
+        description="Configure HTTP proxy settings",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "host": {"type": "string", "description": "Proxy host"},
+                "port": {"type": "number", "description": "Proxy port"}
+            },
+            "required": ["host", "port"]
+        }
+    ),
+    Tool(
+        name="clear_proxy",
+        description="Remove proxy settings",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        }
+    ),
+    Tool(
+        name="install_certificate",
+        description="Install a CA certificate on the device",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "cert_path": {"type": "string", "description": "Path to certificate file (.pem or .crt)"}
+            },
+            "required": ["cert_path"]
+        }
+    ),
+    
+    # Advanced Operations
+    Tool(
+        name="execute_shell",
+        description="Execute a shell command on the device",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "command": {"type": "string", "description": "Shell command to execute"}
+            },
+            "required": ["command"]
+        }
+    ),
+    Tool(
+        name="pull_file",
+        description="Pull a file from the device to local system",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "remote_path": {"type": "string", "description": "Path on device"},
+                "local_path": {"type": "string", "description": "Local destination path"}
+            },
+            "required": ["remote_path", "local_path"]
+        }
+    ),
+    Tool(
+        name="push_file",
+        description="Push a file from local system to device",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "local_path": {"type": "string", "description": "Local file path"},
+                "remote_path": {"type": "string", "description": "Destination path on device"}
+            },
+            "required": ["local_path", "remote_path"]
+        }
+    ),
+)
+
 
 class AndroidEmulatorMCP:
     """MCP Server for Android Emulator interaction."""
@@ -36,21 +655,91 @@ class AndroidEmulatorMCP:
         self.server = Server("android-emulator")
         self.current_device = None
         self.adb_path = self._find_adb()
+        self.adb = AdbClient(self.adb_path)
+        
+        # Long-lived shell session reused by all shell commands; the lock
+        # keeps concurrent tool calls from interleaving on its stream
+        self._shell_conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._shell_sentinel = _SHELL_SENTINEL
+        self._shell_lock = asyncio.Lock()
+        
+        # Build properties never change while a device is up
+        self._device_info_cache: Dict[str, Dict[str, str]] = {}
+        
+        # Installed packages per device as (time fetched, package names)
+        self._pkg_cache: Dict[str, Tuple[float, List[str]]] = {}
+        
+        # With lxml, element lookups run as XPath compiled once per set of
+        # criteria keys; the values are passed in as XPath variables
+        self._xpath_cache: Dict[frozenset, Any] = {}
+        self._xml_parser = etree.XMLParser(huge_tree=True, remove_blank_text=True) if etree else None
+        
+        # Tool name -> coroutine taking the call arguments
+        self._dispatch: Dict[str, Callable[[Dict[str, Any]], Awaitable[List[TextContent | ImageContent]]]] = {
+            "list_devices": lambda a: self._list_devices(),
+            "select_device": lambda a: self._select_device(a["serial"]),
+            "get_device_info": lambda a: self._get_device_info(),
+            "capture_screenshot": lambda a: self._capture_screenshot(a.get("save_path")),
+            "get_ui_hierarchy": lambda a: self._get_ui_hierarchy(),
+            "find_element": lambda a: self._find_element(a),
+            "tap_coordinates": lambda a: self._tap_coordinates(a["x"], a["y"], a.get("settle_ms", 0)),
+            "tap_element": lambda a: self._tap_element(a),
+            "swipe": lambda a: self._swipe(
+                a["start_x"], a["start_y"],
+                a["end_x"], a["end_y"],
+                a.get("duration", 300), a.get("settle_ms", 0)
+            ),
+            "input_text": lambda a: self._input_text(a["text"]),
+            "press_key": lambda a: self._press_key(a["key"], a.get("settle_ms", 0)),
+            "wait_for_idle": lambda a: self._wait_for_idle(a.get("timeout_ms", 5000)),
+            "batch_actions": lambda a: self._batch_actions(a["actions"]),
+            "install_app": lambda a: self._install_app(a["apk_path"]),
+            "launch_app": lambda a: self._launch_app(a["package"]),
+            "stop_app": lambda a: self._stop_app(a["package"]),
+            "clear_app_data": lambda a: self._clear_app_data(a["package"]),
+            "list_packages": lambda a: self._list_packages(a.get("filter")),
+            "setup_proxy": lambda a: self._setup_proxy(a["host"], a["port"]),
+            "clear_proxy": lambda a: self._clear_proxy(),
+            "install_certificate": lambda a: self._install_certificate(a["cert_path"]),
+            "execute_shell": lambda a: self._execute_shell(a["command"]),
+            "pull_file": lambda a: self._pull_file(a["remote_path"], a["local_path"]),
+            "push_file": lambda a: self._push_file(a["local_path"], a["remote_path"]),
+        }
         
         # Setup tool handlers
         self.setup_handlers()
         
     def _find_adb(self) -> str:
         """Find ADB executable in system PATH or Android SDK."""
-        # Try common locations
+        # A PATH hit needs no probing
+        location = shutil.which("adb")
+        if location:
+            logger.info(f"Found ADB at: {location}")
+            return location
+        
+        # Then the location found by a previous run
+        cache_file = Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser() / _ADB_CACHE_FILE
+        try:
+            location = cache_file.read_text().strip()
+            if location and os.access(location, os.X_OK):
+                logger.info(f"Found ADB at: {location}")
+                return location
+        except OSError:
+            pass
+        
+        # Try common SDK locations; PATH was covered by shutil.which
         adb_locations = [
-            "adb",  # In PATH
             os.path.expanduser("~/Android/Sdk/platform-tools/adb"),
             os.path.expanduser("~/Library/Android/sdk/platform-tools/adb"),
             "/usr/local/bin/adb",
         ]
         
-        for location in adb_locations:
+        # Only the first executable candidate is worth running to confirm it works
+        location = next(
+            (loc for loc in adb_locations if os.path.isfile(loc) and os.access(loc, os.X_OK)),
+            None,
+        )
+        if location:
             try:
                 result = subprocess.run(
                     [location, "version"],
@@ -58,17 +747,25 @@ class AndroidEmulatorMCP:
                     text=True,
                     timeout=5
                 )
-                if result.returncode == 0:
-                    logger.info(f"Found ADB at: {location}")
-                    return location
-            except (FileNotFoundError, subprocess.TimeoutExpired):
-                continue
-                
+            except (OSError, subprocess.TimeoutExpired):
+                result = None
+            if result is not None and result.returncode == 0:
+                logger.info(f"Found ADB at: {location}")
+                try:
+                    cache_file.parent.mkdir(parents=True, exist_ok=True)
+                    cache_file.write_text(location)
+                except OSError:
+                    pass
+                return location
+        
         logger.warning("ADB not found in standard locations")
         return "adb"  # Default, will fail if not in PATH
     
-    def _run_adb(self, args: List[str], timeout: int = 30) -> Tuple[str, str, int]:
+    async def _run_adb(self, args: List[str], timeout: int = 30) -> Tuple[str, str, int]:
         """Execute ADB command and return stdout, stderr, returncode."""
+        if self.adb.no_devices():
+            return "", "No devices connected.", 1
+        
         cmd = [self.adb_path]
         
         # Add device serial if set
@@ -78,17 +775,149 @@ class AndroidEmulatorMCP:
         cmd.extend(args)
         
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
-            return result.stdout, result.stderr, result.returncode
-        except subprocess.TimeoutExpired:
+        except Exception as e:
+            return "", str(e), 1
+        
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return "", f"Command timed out after {timeout}s", 1
+        return stdout.decode(errors="replace"), stderr.decode(errors="replace"), proc.returncode
+    
+    async def _get_shell(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Return the persistent shell session, opening it if needed."""
+        if self.adb.no_devices():
+            # Device gone: drop the session so reopening it reports why
+            await self._close_shell()
+        if self._shell_conn is None:
+            self._shell_conn = await self.adb.open_shell(self.current_device)
+            self._shell_sentinel = _SHELL_SENTINEL + secrets.token_hex(8).encode()
+        return self._shell_conn
+    
+    async def _close_shell(self):
+        """Close the persistent shell session, if any."""
+        conn, self._shell_conn = self._shell_conn, None
+        if conn is not None:
+            conn[1].close()
+    
+    @staticmethod
+    async def _read_frames(reader: asyncio.StreamReader, sentinel: bytes) -> Tuple[str, str, str]:
+        """
+        Read shell packets until stdout and stderr both reach the sentinel.
+        
+        Returns (stdout, stderr, trailer), where the stdout trailer is the
+        command's exit status.
+        """
+        marker = b"\n" + sentinel
+        buffers = {_SHELL_STDOUT: bytearray(), _SHELL_STDERR: bytearray()}
+        frames: Dict[int, Tuple[str, str]] = {}
+        
+        while len(frames) < len(buffers):
+            packet_id, payload = await AdbClient.read_shell_packet(reader)
+            if packet_id == _SHELL_EXIT:
+                raise asyncio.IncompleteReadError(b"", None)
+            buf = buffers.get(packet_id)
+            if buf is None or packet_id in frames:
+                continue
+            
+            buf += payload
+            if not buf.endswith(b"\n"):
+                continue
+            # The sentinel is always the last thing written, so only the tail
+            # needs searching
+            idx = buf.rfind(marker, max(0, len(buf) - len(marker) - _SHELL_TRAILER_MAX))
+            if idx >= 0:
+                frames[packet_id] = (
+                    buf[:idx].decode(errors="replace"),
+                    buf[idx + len(marker):].decode().strip(),
+                )
+        
+        (stdout, code), (stderr, _) = frames[_SHELL_STDOUT], frames[_SHELL_STDERR]
+        return stdout, stderr, code
+    
+    async def _run_shell(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
+        """
+        Run a command on the persistent device shell and return stdout, stderr, returncode.
+        
+        Avoids forking an adb client and starting a new device shell per
+        command; the session is a shell_v2 stream to the adb server.
+        """
+        async with self._shell_lock:
+            try:
+                reader, writer = await self._get_shell()
+                
+                sentinel = self._shell_sentinel.decode()
+                # Run the command in a child shell so syntax errors, `exit`,
+                # `cd` and variables can't affect the session; stdin is closed
+                # so commands that read it can't consume the ones that follow
+                script = (
+                    f"sh -c {shlex.quote(command)} </dev/null\n"
+                    f"printf '\\n{sentinel}%d\\n' $?; printf '\\n{sentinel}\\n' >&2\n"
+                )
+                writer.write(AdbClient.shell_packet(_SHELL_STDIN, script.encode()))
+                await writer.drain()
+                
+                stdout, stderr, code = await asyncio.wait_for(
+                    self._read_frames(reader, self._shell_sentinel), timeout=timeout
+                )
+                return stdout, stderr, int(code or 1)
+            except asyncio.TimeoutError:
+                # The command is still running; drop the session with it
+                await self._close_shell()
+                return "", f"Command timed out after {timeout}s", 1
+            except asyncio.IncompleteReadError:
+                # The session shell went away (e.g. adbd restarted)
+                await self._close_shell()
+                return "", "adb shell session closed", 1
+            except Exception as e:
+                await self._close_shell()
+                return "", str(e), 1
+    
+    async def _exec_out(self, command: str, timeout: int = 30) -> Tuple[bytes, str, int]:
+        """Run a command via exec-out and return raw stdout, stderr, returncode."""
+        try:
+            output = await asyncio.wait_for(self.adb.exec_out(self.current_device, command), timeout=timeout)
+        except asyncio.TimeoutError:
+            return b"", f"Command timed out after {timeout}s", 1
+        except Exception as e:
+            return b"", str(e), 1
+        return output, "", 0
+    
+    async def _sync_pull(self, remote_path: str, local_path: str, timeout: int = 30) -> Tuple[str, str, int]:
+        """Pull a file over the sync protocol and return stdout, stderr, returncode."""
+        try:
+            size = await asyncio.wait_for(
+                self.adb.pull(self.current_device, remote_path, local_path), timeout=timeout
+            )
+        except asyncio.TimeoutError:
             return "", f"Command timed out after {timeout}s", 1
         except Exception as e:
             return "", str(e), 1
+        return f"{remote_path}: 1 file pulled ({size} bytes)", "", 0
+    
+    async def _sync_push(self, local_path: str, remote_path: str, timeout: int = 30) -> Tuple[str, str, int]:
+        """Push a file over the sync protocol and return stdout, stderr, returncode."""
+        try:
+            size = await asyncio.wait_for(
+                self.adb.push(self.current_device, local_path, remote_path), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            return "", f"Command timed out after {timeout}s", 1
+        except Exception as e:
+            return "", str(e), 1
+        return f"{local_path}: 1 file pushed ({size} bytes)", "", 0
+    
+    async def close(self):
+        """Close the persistent shell session."""
+        async with self._shell_lock:
+            await self._close_shell()
     
     def setup_handlers(self):
         """Register all MCP tool handlers."""
@@ -96,323 +925,16 @@ class AndroidEmulatorMCP:
         @self.server.list_tools()
         async def list_tools() -> List[Tool]:
             """List all available tools."""
-            return [
-                # Device Management
-                Tool(
-                    name="list_devices",
-                    description="List all available Android devices and emulators",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                    }
-                ),
-                Tool(
-                    name="select_device",
-                    description="Select a specific device/emulator to interact with",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "serial": {
-                                "type": "string",
-                                "description": "Device serial number (e.g., emulator-5554)"
-                            }
-                        },
-                        "required": ["serial"]
-                    }
-                ),
-                Tool(
-                    name="get_device_info",
-                    description="Get detailed information about the current device",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                    }
-                ),
-                
-                # Screen Inspection
-                Tool(
-                    name="capture_screenshot",
-                    description="Capture a screenshot of the current screen",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "save_path": {
-                                "type": "string",
-                                "description": "Optional path to save screenshot locally"
-                            }
-                        }
-                    }
-                ),
-                Tool(
-                    name="get_ui_hierarchy",
-                    description="Get the XML hierarchy of the current screen UI",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                    }
-                ),
-                Tool(
-                    name="find_element",
-                    description="Find UI element by text, resource-id, or other attributes",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "text": {"type": "string", "description": "Element text"},
-                            "resource_id": {"type": "string", "description": "Resource ID"},
-                            "class_name": {"type": "string", "description": "Class name"},
-                            "content_desc": {"type": "string", "description": "Content description"}
-                        }
-                    }
-                ),
-                
-                # UI Interaction
-                Tool(
-                    name="tap_coordinates",
-                    description="Tap at specific screen coordinates",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "x": {"type": "number", "description": "X coordinate"},
-                            "y": {"type": "number", "description": "Y coordinate"}
-                        },
-                        "required": ["x", "y"]
-                    }
-                ),
-                Tool(
-                    name="tap_element",
-                    description="Tap on a UI element by finding it first",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "text": {"type": "string", "description": "Element text"},
-                            "resource_id": {"type": "string", "description": "Resource ID"},
-                            "content_desc": {"type": "string", "description": "Content description"}
-                        }
-                    }
-                ),
-                Tool(
-                    name="swipe",
-                    description="Perform a swipe gesture",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "start_x": {"type": "number"},
-                            "start_y": {"type": "number"},
-                            "end_x": {"type": "number"},
-                            "end_y": {"type": "number"},
-                            "duration": {"type": "number", "description": "Duration in ms", "default": 300}
-                        },
-                        "required": ["start_x", "start_y", "end_x", "end_y"]
-                    }
-                ),
-                Tool(
-                    name="input_text",
-                    description="Input text into the currently focused field",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "text": {"type": "string", "description": "Text to input"}
-                        },
-                        "required": ["text"]
-                    }
-                ),
-                Tool(
-                    name="press_key",
-                    description="Press a system key (back, home, recent, etc.)",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "key": {
-                                "type": "string",
-                                "enum": ["back", "home", "recent", "menu", "power", "volume_up", "volume_down"],
-                                "description": "Key to press"
-                            }
-                        },
-                        "required": ["key"]
-                    }
-                ),
-                
-                # App Management
-                Tool(
-                    name="install_app",
-                    description="Install an APK on the device",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "apk_path": {"type": "string", "description": "Path to APK file"}
-                        },
-                        "required": ["apk_path"]
-                    }
-                ),
-                Tool(
-                    name="launch_app",
-                    description="Launch an app by package name",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "package": {"type": "string", "description": "Package name (e.g., com.android.settings)"}
-                        },
-                        "required": ["package"]
-                    }
-                ),
-                Tool(
-                    name="stop_app",
-                    description="Force stop an app",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "package": {"type": "string", "description": "Package name"}
-                        },
-                        "required": ["package"]
-                    }
-                ),
-                Tool(
-                    name="clear_app_data",
-                    description="Clear app data and cache",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "package": {"type": "string", "description": "Package name"}
-                        },
-                        "required": ["package"]
-                    }
-                ),
-                Tool(
-                    name="list_packages",
-                    description="List installed packages",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "filter": {"type": "string", "description": "Optional filter string"}
-                        }
-                    }
-                ),
-                
-                # Network Configuration
-                Tool(
-                    name="setup_proxy",
-                    description="Configure HTTP proxy settings",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "host": {"type": "string", "description": "Proxy host"},
-                            "port": {"type": "number", "description": "Proxy port"}
-                        },
-                        "required": ["host", "port"]
-                    }
-                ),
-                Tool(
-                    name="clear_proxy",
-                    description="Remove proxy settings",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                    }
-                ),
-                Tool(
-                    name="install_certificate",
-                    description="Install a CA certificate on the device",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "cert_path": {"type": "string", "description": "Path to certificate file (.pem or .crt)"}
-                        },
-                        "required": ["cert_path"]
-                    }
-                ),
-                
-                # Advanced Operations
-                Tool(
-                    name="execute_shell",
-                    description="Execute a shell command on the device",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "command": {"type": "string", "description": "Shell command to execute"}
-                        },
-                        "required": ["command"]
-                    }
-                ),
-                Tool(
-                    name="pull_file",
-                    description="Pull a file from the device to local system",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "remote_path": {"type": "string", "description": "Path on device"},
-                            "local_path": {"type": "string", "description": "Local destination path"}
-                        },
-                        "required": ["remote_path", "local_path"]
-                    }
-                ),
-                Tool(
-                    name="push_file",
-                    description="Push a file from local system to device",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "local_path": {"type": "string", "description": "Local file path"},
-                            "remote_path": {"type": "string", "description": "Destination path on device"}
-                        },
-                        "required": ["local_path", "remote_path"]
-                    }
-                ),
-            ]
+            return list(_TOOLS)
         
         @self.server.call_tool()
         async def call_tool(name: str, arguments: Any) -> List[TextContent | ImageContent]:
             """Handle tool calls."""
             try:
-                if name == "list_devices":
-                    return await self._list_devices()
-                elif name == "select_device":
-                    return await self._select_device(arguments["serial"])
-                elif name == "get_device_info":
-                    return await self._get_device_info()
-                elif name == "capture_screenshot":
-                    return await self._capture_screenshot(arguments.get("save_path"))
-                elif name == "get_ui_hierarchy":
-                    return await self._get_ui_hierarchy()
-                elif name == "find_element":
-                    return await self._find_element(arguments)
-                elif name == "tap_coordinates":
-                    return await self._tap_coordinates(arguments["x"], arguments["y"])
-                elif name == "tap_element":
-                    return await self._tap_element(arguments)
-                elif name == "swipe":
-                    return await self._swipe(
-                        arguments["start_x"], arguments["start_y"],
-                        arguments["end_x"], arguments["end_y"],
-                        arguments.get("duration", 300)
-                    )
-                elif name == "input_text":
-                    return await self._input_text(arguments["text"])
-                elif name == "press_key":
-                    return await self._press_key(arguments["key"])
-                elif name == "install_app":
-                    return await self._install_app(arguments["apk_path"])
-                elif name == "launch_app":
-                    return await self._launch_app(arguments["package"])
-                elif name == "stop_app":
-                    return await self._stop_app(arguments["package"])
-                elif name == "clear_app_data":
-                    return await self._clear_app_data(arguments["package"])
-                elif name == "list_packages":
-                    return await self._list_packages(arguments.get("filter"))
-                elif name == "setup_proxy":
-                    return await self._setup_proxy(arguments["host"], arguments["port"])
-                elif name == "clear_proxy":
-                    return await self._clear_proxy()
-                elif name == "install_certificate":
-                    return await self._install_certificate(arguments["cert_path"])
-                elif name == "execute_shell":
-                    return await self._execute_shell(arguments["command"])
-                elif name == "pull_file":
-                    return await self._pull_file(arguments["remote_path"], arguments["local_path"])
-                elif name == "push_file":
-                    return await self._push_file(arguments["local_path"], arguments["remote_path"])
-                else:
+                handler = self._dispatch.get(name)
+                if handler is None:
                     return [TextContent(type="text", text=f"Unknown tool: {name}")]
+                return await handler(arguments)
             except Exception as e:
                 logger.error(f"Error executing {name}: {e}", exc_info=True)
                 return [TextContent(type="text", text=f"Error: {str(e)}")]
@@ -421,22 +943,17 @@ class AndroidEmulatorMCP:
     
     async def _list_devices(self) -> List[TextContent]:
         """List all connected devices."""
-        stdout, stderr, code = self._run_adb(["devices", "-l"])
-        
-        if code != 0:
-            return [TextContent(type="text", text=f"Error listing devices: {stderr}")]
-        
-        lines = stdout.strip().split("\n")[1:]  # Skip header
-        devices = []
+        try:
+            listing = await asyncio.wait_for(self.adb.devices(), timeout=30)
+        except asyncio.TimeoutError:
+            return [TextContent(type="text", text="Error listing devices: adb server did not answer within 30s")]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error listing devices: {e}")]
         
-        for line in lines:
-            if line.strip():
-                parts = line.split()
-                if len(parts) >= 2:
-                    serial = parts[0]
-                    state = parts[1]
-                    extra_info = " ".join(parts[2:]) if len(parts) > 2 else ""
-                    devices.append(f"Serial: {serial}, State: {state}, Info: {extra_info}")
+        devices = [
+            f"Serial: {serial}, State: {state}, Info: {extra_info}"
+            for serial, state, extra_info in listing
+        ]
         
         if not devices:
             result = "No devices found. Make sure an emulator is running or a device is connected."
@@ -447,6 +964,9 @@ class AndroidEmulatorMCP:
     
     async def _select_device(self, serial: str) -> List[TextContent]:
         """Select a device to interact with."""
+        if serial != self.current_device:
+            # The shell session is bound to the previous device
+            await self.close()
         self.current_device = serial
         return [TextContent(type="text", text=f"Selected device: {serial}")]
     
@@ -455,25 +975,26 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected. Use list_devices and select_device first.")]
         
-        info = {}
-        
-        # Get various device properties
-        properties = [
-            "ro.product.model",
-            "ro.build.version.release",
-            "ro.build.version.sdk",
-            "ro.product.cpu.abi",
-        ]
-        
-        for prop in properties:
-            stdout, _, code = self._run_adb(["shell", "getprop", prop])
-            if code == 0:
-                info[prop] = stdout.strip()
-        
-        # Get screen resolution
-        stdout, _, code = self._run_adb(["shell", "wm", "size"])
-        if code == 0:
-            info["screen_size"] = stdout.strip()
+        info = self._device_info_cache.get(self.current_device)
+        if info is None:
+            # Read every property in one round-trip on the session shell, while
+            # the much slower `wm size` (it starts a Java client) runs
+            # alongside on a connection of its own
+            (stdout, stderr, code), size = await asyncio.gather(
+                self._run_shell(_DEVICE_INFO_SCRIPT),
+                asyncio.wait_for(self.adb.shell(self.current_device, "wm size"), timeout=30),
+                return_exceptions=True,
+            )
+            
+            if code != 0:
+                return [TextContent(type="text", text=f"Failed to get device info: {stderr}")]
+            
+            info = dict(zip(_DEVICE_PROPERTIES, [value.strip() for value in stdout.split("---\n")]))
+            if not isinstance(size, Exception) and size[2] == 0:
+                info["screen_size"] = size[0].strip()
+            
+            if len(info) == len(_DEVICE_PROPERTIES) + 1:
+                self._device_info_cache[self.current_device] = info
         
         result = json.dumps(info, indent=2)
         return [TextContent(type="text", text=f"Device Information:\n{result}")]
@@ -485,175 +1006,206 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        # Capture screenshot on device
-        remote_path = "/sdcard/screenshot.png"
-        stdout, stderr, code = self._run_adb(["shell", "screencap", "-p", remote_path])
+        # Stream the PNG straight back instead of going through /sdcard
+        image_bytes, stderr, code = await self._exec_out("screencap -p")
         
-        if code != 0:
-            return [TextContent(type="text", text=f"Failed to capture screenshot: {stderr}")]
+        if code != 0 or not image_bytes.startswith(b"\x89PNG"):
+            error = stderr or image_bytes.decode(errors="replace").strip()
+            return [TextContent(type="text", text=f"Failed to capture screenshot: {error}")]
+        
+        message = "Screenshot captured successfully."
+        if save_path:
+            try:
+                await asyncio.to_thread(Path(save_path).write_bytes, image_bytes)
+            except Exception as e:
+                return [TextContent(type="text", text=f"Error saving screenshot: {e}")]
+            message += f" Saved to: {save_path}"
         
-        # Pull screenshot to local
-        local_path = save_path or "/tmp/android_screenshot.png"
-        stdout, stderr, code = self._run_adb(["pull", remote_path, local_path])
+        image_data = binascii.b2a_base64(image_bytes, newline=False).decode("ascii")
+        return [
+            TextContent(type="text", text=message),
+            ImageContent(type="image", data=image_data, mimeType="image/png")
+        ]
+    
+    async def _dump_ui_xml(self) -> bytes:
+        """Dump the current UI hierarchy and return the raw XML."""
+        if not self.current_device:
+            raise AdbError("No device selected.")
         
-        if code != 0:
-            return [TextContent(type="text", text=f"Failed to pull screenshot: {stderr}")]
+        # Dump to a device file and cat it back in the same round-trip; the
+        # "UI hierchary dumped to: ..." banner is discarded with stdout
+        output, stderr, code = await self._exec_out(
+            f"uiautomator dump {_UI_DUMP_PATH} >/dev/null && cat {_UI_DUMP_PATH}"
+        )
+        start = output.find(b"<?xml")
+        end = output.rfind(b">") + 1
         
-        # Read and encode as base64
-        try:
-            with open(local_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode()
-            
-            return [
-                TextContent(type="text", text=f"Screenshot captured successfully. Saved to: {local_path}"),
-                ImageContent(type="image", data=image_data, mimeType="image/png")
+        if code != 0 or start < 0:
+            error = stderr or output.decode(errors="replace").strip()
+            raise AdbError(f"Failed to dump UI: {error}")
+        
+        return output[start:end]
+    
+    async def _dump_ui_tree(self) -> ET.Element:
+        """Dump the current UI hierarchy and return the parsed root element."""
+        xml_content = await self._dump_ui_xml()
+        if etree is not None:
+            return etree.fromstring(xml_content, self._xml_parser)
+        return ET.fromstring(xml_content)
+    
+    def _compile_xpath(self, keys: frozenset):
+        """Return the cached XPath selecting nodes whose attributes equal the given criteria."""
+        xpath = self._xpath_cache.get(keys)
+        if xpath is None:
+            tests = " and ".join(f"@{attr}=${key}" for key, attr in _CRITERIA_ATTRS.items() if key in keys)
+            xpath = self._xpath_cache[keys] = etree.XPath(f".//node[{tests}]")
+        return xpath
+    
+    async def _find_element_raw(self, criteria: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Return attribute dicts for every element matching the criteria."""
+        if not any(k in criteria for k in _CRITERIA_ATTRS):
+            return []
+        
+        root = await self._dump_ui_tree()
+        
+        if etree is not None:
+            wanted = {k: v for k, v in criteria.items() if k in _CRITERIA_ATTRS}
+            elements = self._compile_xpath(frozenset(wanted))(root, **wanted)
+        else:
+            # Search for elements matching criteria
+            elements = [
+                elem for elem in root.iter()
+                if all(elem.get(attr) == criteria[key] for key, attr in _CRITERIA_ATTRS.items() if key in criteria)
             ]
-        except Exception as e:
-            return [TextContent(type="text", text=f"Error reading screenshot: {e}")]
+        
+        return [self._element_info(elem) for elem in elements]
+    
+    async def _find_first(self, criteria: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Return the first element matching the criteria, stopping the parse as soon as it is found."""
+        if not any(k in criteria for k in _CRITERIA_ATTRS):
+            return None
+        
+        tests = [(attr, criteria[key]) for key, attr in _CRITERIA_ATTRS.items() if key in criteria]
+        xml_content = await self._dump_ui_xml()
+        
+        # Attributes are complete on "start", which also keeps document order;
+        # finished subtrees are cleared on "end" so memory stays O(depth)
+        for event, elem in ET.iterparse(io.BytesIO(xml_content), events=("start", "end")):
+            if event == "end":
+                elem.clear()
+            elif all(elem.get(attr) == value for attr, value in tests):
+                return self._element_info(elem)
+        return None
+    
+    @staticmethod
+    def _element_info(elem) -> Dict[str, Any]:
+        """Summarize a dump node as returned by find_element."""
+        return {
+            "text": elem.get("text"),
+            "resource-id": elem.get("resource-id"),
+            "class": elem.get("class"),
+            "bounds": elem.get("bounds"),
+            "clickable": elem.get("clickable"),
+            "enabled": elem.get("enabled"),
+        }
     
     async def _get_ui_hierarchy(self) -> List[TextContent]:
         """Get UI hierarchy XML."""
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        # Dump UI hierarchy
-        stdout, stderr, code = self._run_adb(["shell", "uiautomator", "dump", "/sdcard/window_dump.xml"])
-        
-        if code != 0:
-            return [TextContent(type="text", text=f"Failed to dump UI: {stderr}")]
-        
-        # Pull the XML file
-        local_path = "/tmp/ui_hierarchy.xml"
-        stdout, stderr, code = self._run_adb(["pull", "/sdcard/window_dump.xml", local_path])
-        
-        if code != 0:
-            return [TextContent(type="text", text=f"Failed to pull UI dump: {stderr}")]
-        
         try:
-            with open(local_path, "r") as f:
-                xml_content = f.read()
-            
-            return [TextContent(type="text", text=f"UI Hierarchy:\n{xml_content}")]
+            xml_content = (await self._dump_ui_xml()).decode("utf-8", errors="replace")
         except Exception as e:
-            return [TextContent(type="text", text=f"Error reading UI hierarchy: {e}")]
+            return [TextContent(type="text", text=str(e))]
+        
+        return [TextContent(type="text", text=f"UI Hierarchy:\n{xml_content}")]
     
     async def _find_element(self, criteria: Dict[str, str]) -> List[TextContent]:
         """Find element in UI hierarchy."""
-        # First get the UI hierarchy
-        hierarchy_result = await self._get_ui_hierarchy()
-        
-        if not hierarchy_result or "Error" in hierarchy_result[0].text:
-            return hierarchy_result
-        
-        xml_content = hierarchy_result[0].text.replace("UI Hierarchy:\n", "")
+        if not self.current_device:
+            return [TextContent(type="text", text="No device selected.")]
         
         try:
-            root = ET.fromstring(xml_content)
-            matches = []
-            
-            # Search for elements matching criteria
-            for elem in root.iter():
-                match = True
-                
-                if "text" in criteria and elem.get("text") != criteria["text"]:
-                    match = False
-                if "resource_id" in criteria and elem.get("resource-id") != criteria["resource_id"]:
-                    match = False
-                if "class_name" in criteria and elem.get("class") != criteria["class_name"]:
-                    match = False
-                if "content_desc" in criteria and elem.get("content-desc") != criteria["content_desc"]:
-                    match = False
-                
-                if match and any(k in criteria for k in ["text", "resource_id", "class_name", "content_desc"]):
-                    bounds = elem.get("bounds")
-                    matches.append({
-                        "text": elem.get("text"),
-                        "resource-id": elem.get("resource-id"),
-                        "class": elem.get("class"),
-                        "bounds": bounds,
-                        "clickable": elem.get("clickable"),
-                        "enabled": elem.get("enabled"),
-                    })
-            
-            if matches:
-                result = f"Found {len(matches)} matching element(s):\n" + json.dumps(matches, indent=2)
-            else:
-                result = "No matching elements found."
-            
-            return [TextContent(type="text", text=result)]
-            
+            matches = await self._find_element_raw(criteria)
+        except AdbError as e:
+            return [TextContent(type="text", text=str(e))]
         except Exception as e:
             return [TextContent(type="text", text=f"Error parsing UI hierarchy: {e}")]
+        
+        if matches:
+            result = f"Found {len(matches)} matching element(s):\n" + json.dumps(matches, indent=2)
+        else:
+            result = "No matching elements found."
+        
+        return [TextContent(type="text", text=result)]
     
     # UI Interaction Implementation
     
-    async def _tap_coordinates(self, x: float, y: float) -> List[TextContent]:
+    async def _tap_coordinates(self, x: float, y: float, settle_ms: int = 0) -> List[TextContent]:
         """Tap at coordinates."""
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb(["shell", "input", "tap", str(int(x)), str(int(y))])
+        stdout, stderr, code = await self._run_shell(f"input tap {int(x)} {int(y)}")
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to tap: {stderr}")]
         
-        # Add small delay for UI to respond
-        await asyncio.sleep(0.5)
+        # The next UI dump already waits for the screen, so only pause on request
+        if settle_ms > 0:
+            await asyncio.sleep(settle_ms / 1000)
         
         return [TextContent(type="text", text=f"Tapped at coordinates ({int(x)}, {int(y)})")]
     
     async def _tap_element(self, criteria: Dict[str, str]) -> List[TextContent]:
         """Find and tap an element."""
-        # First find the element
-        find_result = await self._find_element(criteria)
-        
-        if "No matching elements" in find_result[0].text or "Error" in find_result[0].text:
-            return find_result
+        if not self.current_device:
+            return [TextContent(type="text", text="No device selected.")]
         
-        # Parse the result to get bounds
         try:
-            result_text = find_result[0].text
-            matches = json.loads(result_text.split(":\n", 1)[1])
+            match = await self._find_first(criteria)
             
-            if not matches:
-                return [TextContent(type="text", text="No elements found to tap.")]
+            if not match:
+                return [TextContent(type="text", text="No matching elements found.")]
             
             # Get bounds of first match
-            bounds = matches[0].get("bounds")
+            bounds = match.get("bounds")
             if not bounds:
                 return [TextContent(type="text", text="Element has no bounds information.")]
             
             # Parse bounds [x1,y1][x2,y2]
-            import re
-            coords = re.findall(r'\d+', bounds)
-            if len(coords) >= 4:
-                x1, y1, x2, y2 = map(int, coords[:4])
-                center_x = (x1 + x2) // 2
-                center_y = (y1 + y2) // 2
-                
-                return await self._tap_coordinates(center_x, center_y)
-            else:
+            try:
+                top_left, bottom_right = bounds[1:-1].split("][", 1)
+                x1, y1 = map(int, top_left.split(","))
+                x2, y2 = map(int, bottom_right.split(","))
+            except ValueError:
                 return [TextContent(type="text", text=f"Could not parse bounds: {bounds}")]
-                
+            
+            center_x = (x1 + x2) // 2
+            center_y = (y1 + y2) // 2
+            
+            return await self._tap_coordinates(center_x, center_y)
+            
+        except AdbError as e:
+            return [TextContent(type="text", text=str(e))]
         except Exception as e:
             return [TextContent(type="text", text=f"Error tapping element: {e}")]
     
-    async def _swipe(self, start_x: float, start_y: float, end_x: float, end_y: float, duration: int = 300) -> List[TextContent]:
+    async def _swipe(self, start_x: float, start_y: float, end_x: float, end_y: float, duration: int = 300, settle_ms: int = 0) -> List[TextContent]:
         """Perform swipe gesture."""
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb([
-            "shell", "input", "swipe",
-            str(int(start_x)), str(int(start_y)),
-            str(int(end_x)), str(int(end_y)),
-            str(duration)
-        ])
+        stdout, stderr, code = await self._run_shell(
+            f"input swipe {int(start_x)} {int(start_y)} {int(end_x)} {int(end_y)} {duration}"
+        )
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to swipe: {stderr}")]
         
-        await asyncio.sleep(0.5)
+        if settle_ms > 0:
+            await asyncio.sleep(settle_ms / 1000)
         
         return [TextContent(type="text", text=f"Swiped from ({int(start_x)}, {int(start_y)}) to ({int(end_x)}, {int(end_y)})")]
     
@@ -662,44 +1214,126 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        # Escape special characters
-        escaped_text = text.replace(" ", "%s").replace("'", "\\'")
+        if len(text) > _ADB_KEYBOARD_MIN_LENGTH or not text.isascii():
+            stdout, _, code = await self._run_shell("settings get secure default_input_method")
+            if code == 0 and stdout.strip() == _ADB_KEYBOARD_IME:
+                encoded = binascii.b2a_base64(text.encode(), newline=False).decode("ascii")
+                stdout, stderr, code = await self._run_shell(f"am broadcast -a ADB_INPUT_B64 --es msg {encoded}")
+                
+                if code != 0:
+                    return [TextContent(type="text", text=f"Failed to input text: {stderr}")]
+                
+                return [TextContent(type="text", text=f"Entered text: {text}")]
         
-        stdout, stderr, code = self._run_adb(["shell", "input", "text", escaped_text])
+        stdout, stderr, code = await self._run_shell(f"input text {shlex.quote(text)}")
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to input text: {stderr}")]
         
         return [TextContent(type="text", text=f"Entered text: {text}")]
     
-    async def _press_key(self, key: str) -> List[TextContent]:
+    async def _press_key(self, key: str, settle_ms: int = 0) -> List[TextContent]:
         """Press system key."""
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        key_codes = {
-            "back": "4",
-            "home": "3",
-            "recent": "187",
-            "menu": "82",
-            "power": "26",
-            "volume_up": "24",
-            "volume_down": "25",
-        }
-        
-        key_code = key_codes.get(key)
+        key_code = _KEY_CODES.get(key)
         if not key_code:
             return [TextContent(type="text", text=f"Unknown key: {key}")]
         
-        stdout, stderr, code = self._run_adb(["shell", "input", "keyevent", key_code])
+        stdout, stderr, code = await self._run_shell(f"input keyevent {key_code}")
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to press key: {stderr}")]
         
-        await asyncio.sleep(0.3)
+        if settle_ms > 0:
+            await asyncio.sleep(settle_ms / 1000)
         
         return [TextContent(type="text", text=f"Pressed {key} key")]
     
+    async def _wait_for_idle(self, timeout_ms: int = 5000) -> List[TextContent]:
+        """
+        Poll the focused window until it has changed and then settled.
+        
+        Right after a tap the old window is still focused, so matching reads
+        only count once the focus differs from its value at call time. If it
+        hasn't moved within _IDLE_NO_CHANGE_S the action opened nothing.
+        """
+        if not self.current_device:
+            return [TextContent(type="text", text="No device selected.")]
+        
+        start = time.monotonic()
+        deadline = start + timeout_ms / 1000
+        initial = previous = None
+        while True:
+            stdout, stderr, code = await self._run_shell("dumpsys window | grep -E 'mCurrentFocus|mFocusedApp'")
+            if code != 0:
+                return [TextContent(type="text", text=f"Failed to read window focus: {stderr}")]
+            
+            focus = stdout.strip()
+            if initial is None:
+                initial = focus
+            elif focus != initial and focus == previous:
+                return [TextContent(type="text", text=f"UI idle:\n{focus}")]
+            elif focus == initial and time.monotonic() - start >= _IDLE_NO_CHANGE_S:
+                return [TextContent(type="text", text=f"Focus unchanged after {_IDLE_NO_CHANGE_S:g} s:\n{focus}")]
+            previous = focus
+            
+            if time.monotonic() >= deadline:
+                return [TextContent(type="text", text=f"UI still changing after {timeout_ms} ms:\n{focus}")]
+            await asyncio.sleep(0.1)
+    
+    @staticmethod
+    def _action_command(action: str, args: Dict[str, Any]) -> str:
+        """Return the shell command performing one batch_actions step."""
+        if action == "tap":
+            return f"input tap {int(args['x'])} {int(args['y'])}"
+        if action == "swipe":
+            return (
+                f"input swipe {int(args['start_x'])} {int(args['start_y'])} "
+                f"{int(args['end_x'])} {int(args['end_y'])} {int(args.get('duration', 300))}"
+            )
+        if action == "input_text":
+            return f"input text {shlex.quote(args['text'])}"
+        if action == "press_key":
+            key_code = _KEY_CODES.get(args["key"])
+            if not key_code:
+                raise ValueError(f"Unknown key: {args['key']}")
+            return f"input keyevent {key_code}"
+        if action == "sleep":
+            return f"sleep {int(args['ms']) / 1000:g}"
+        raise ValueError(f"Unknown action: {action}")
+    
+    async def _batch_actions(self, actions: List[Dict[str, Any]]) -> List[TextContent]:
+        """Run a sequence of input actions as one shell command."""
+        if not self.current_device:
+            return [TextContent(type="text", text="No device selected.")]
+        
+        commands = []
+        pause_ms = 0
+        for index, step in enumerate(actions):
+            args = step.get("args", {})
+            try:
+                commands.append(self._action_command(step["action"], args))
+            except KeyError as e:
+                return [TextContent(type="text", text=f"Invalid action #{index + 1}: missing {e}")]
+            except (TypeError, ValueError) as e:
+                return [TextContent(type="text", text=f"Invalid action #{index + 1}: {e}")]
+            if step["action"] == "sleep":
+                pause_ms += int(args["ms"])
+        
+        if not commands:
+            return [TextContent(type="text", text="No actions to run.")]
+        
+        # Delays between steps run on the device, so allow for them on top
+        # of the usual command timeout
+        stdout, stderr, code = await self._run_shell(" && ".join(commands), timeout=30 + pause_ms // 1000)
+        
+        if code != 0:
+            return [TextContent(type="text", text=f"Batch failed: {stderr}")]
+        
+        return [TextContent(type="text", text=f"Ran {len(commands)} action(s)")]
+    
     # App Management Implementation
     
     async def _install_app(self, apk_path: str) -> List[TextContent]:
@@ -710,11 +1344,13 @@ class AndroidEmulatorMCP:
         if not os.path.exists(apk_path):
             return [TextContent(type="text", text=f"APK file not found: {apk_path}")]
         
-        stdout, stderr, code = self._run_adb(["install", "-r", apk_path], timeout=120)
+        stdout, stderr, code = await self._run_adb(["install", "-r", apk_path], timeout=120)
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to install app: {stderr}")]
         
+        self._pkg_cache.pop(self.current_device, None)
+        
         return [TextContent(type="text", text=f"Successfully installed: {apk_path}\n{stdout}")]
     
     async def _launch_app(self, package: str) -> List[TextContent]:
@@ -723,23 +1359,37 @@ class AndroidEmulatorMCP:
             return [TextContent(type="text", text="No device selected.")]
         
         # Use monkey to launch the app
-        stdout, stderr, code = self._run_adb([
-            "shell", "monkey", "-p", package, "-c", "android.intent.category.LAUNCHER", "1"
-        ])
+        stdout, stderr, code = await self._run_shell(
+            f"monkey -p {shlex.quote(package)} -c android.intent.category.LAUNCHER 1"
+        )
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to launch app: {stderr}")]
         
-        await asyncio.sleep(2)  # Wait for app to launch
+        if not await self._wait_focus(package):
+            return [TextContent(type="text", text=f"Launched app: {package} (not in the foreground yet)")]
         
         return [TextContent(type="text", text=f"Launched app: {package}")]
     
+    async def _wait_focus(self, package: str, timeout: float = 5) -> bool:
+        """Poll until a window of the package has input focus; returns False on timeout."""
+        # A resumed activity may not have drawn its window yet, so wait for
+        # focus, which is what the taps and text input that follow need
+        deadline = time.monotonic() + timeout
+        while True:
+            stdout, _, _ = await self._run_shell("dumpsys window | grep mCurrentFocus")
+            if f" {package}/" in stdout:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+    
     async def _stop_app(self, package: str) -> List[TextContent]:
         """Stop app."""
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb(["shell", "am", "force-stop", package])
+        stdout, stderr, code = await self._run_shell(f"am force-stop {shlex.quote(package)}")
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to stop app: {stderr}")]
@@ -751,7 +1401,7 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb(["shell", "pm", "clear", package])
+        stdout, stderr, code = await self._run_shell(f"pm clear {shlex.quote(package)}")
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to clear app data: {stderr}")]
@@ -763,16 +1413,22 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        cmd = ["shell", "pm", "list", "packages"]
-        if filter_str:
-            cmd.extend(["|", "grep", filter_str])
-        
-        stdout, stderr, code = self._run_adb(cmd)
-        
-        if code != 0:
-            return [TextContent(type="text", text=f"Failed to list packages: {stderr}")]
+        cached = self._pkg_cache.get(self.current_device)
+        if cached and time.monotonic() - cached[0] < _PKG_CACHE_TTL:
+            packages = cached[1]
+        else:
+            stdout, stderr, code = await self._run_shell("pm list packages")
+            
+            if code != 0:
+                return [TextContent(type="text", text=f"Failed to list packages: {stderr}")]
+            
+            packages = [line[8:] for line in stdout.splitlines() if line.startswith("package:")]
+            self._pkg_cache[self.current_device] = (time.monotonic(), packages)
         
-        packages = [line.replace("package:", "") for line in stdout.strip().split("\n") if line]
+        # Filter here rather than piping through grep on the device, so
+        # cached listings serve filtered calls too
+        if filter_str:
+            packages = [package for package in packages if filter_str in package]
         
         result = f"Found {len(packages)} package(s):\n" + "\n".join(packages[:100])
         if len(packages) > 100:
@@ -789,9 +1445,9 @@ class AndroidEmulatorMCP:
         
         proxy_string = f"{host}:{port}"
         
-        stdout, stderr, code = self._run_adb([
-            "shell", "settings", "put", "global", "http_proxy", proxy_string
-        ])
+        stdout, stderr, code = await self._run_shell(
+            f"settings put global http_proxy {shlex.quote(proxy_string)}"
+        )
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to set proxy: {stderr}")]
@@ -803,9 +1459,7 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb([
-            "shell", "settings", "put", "global", "http_proxy", ":0"
-        ])
+        stdout, stderr, code = await self._run_shell("settings put global http_proxy :0")
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to clear proxy: {stderr}")]
@@ -817,12 +1471,17 @@ class AndroidEmulatorMCP:
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        if not os.path.exists(cert_path):
-            return [TextContent(type="text", text=f"Certificate file not found: {cert_path}")]
+        # Catch directories or the wrong file before paying for the transfer
+        try:
+            st = os.stat(cert_path)
+        except OSError as e:
+            return [TextContent(type="text", text=f"Certificate file not found: {e}")]
+        if not stat.S_ISREG(st.st_mode) or st.st_size > _CERT_MAX_SIZE:
+            return [TextContent(type="text", text=f"Not a certificate file (expected a regular file up to {_CERT_MAX_SIZE} bytes): {cert_path}")]
         
         # Push certificate to device
         remote_path = "/sdcard/Download/ca_cert.crt"
-        stdout, stderr, code = self._run_adb(["push", cert_path, remote_path])
+        stdout, stderr, code = await self._sync_push(cert_path, remote_path)
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to push certificate: {stderr}")]
@@ -854,7 +1513,7 @@ Use 'tap_element' and other UI tools to navigate through Settings automatically.
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb(["shell", command], timeout=60)
+        stdout, stderr, code = await self._run_shell(command, timeout=60)
         
         result = f"Command: {command}\nReturn Code: {code}\n\nOutput:\n{stdout}"
         if stderr:
@@ -867,7 +1526,7 @@ Use 'tap_element' and other UI tools to navigate through Settings automatically.
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        stdout, stderr, code = self._run_adb(["pull", remote_path, local_path])
+        stdout, stderr, code = await self._sync_pull(remote_path, local_path)
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to pull file: {stderr}")]
@@ -879,10 +1538,7 @@ Use 'tap_element' and other UI tools to navigate through Settings automatically.
         if not self.current_device:
             return [TextContent(type="text", text="No device selected.")]
         
-        if not os.path.exists(local_path):
-            return [TextContent(type="text", text=f"Local file not found: {local_path}")]
-        
-        stdout, stderr, code = self._run_adb(["push", local_path, remote_path])
+        stdout, stderr, code = await self._sync_push(local_path, remote_path)
         
         if code != 0:
             return [TextContent(type="text", text=f"Failed to push file: {stderr}")]
@@ -894,12 +1550,15 @@ async def main():
     """Main entry point for the MCP server."""
     mcp = AndroidEmulatorMCP()
     
-    async with stdio_server() as (read_stream, write_stream):
-        await mcp.server.run(
-            read_stream,
-            write_stream,
-            mcp.server.create_initialization_options()
-        )
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await mcp.server.run(
+                read_stream,
+                write_stream,
+                mcp.server.create_initialization_options()
+            )
+    finally:
+        await mcp.close()
 
 
 if __name__ == "__main__":
@@ -4,10 +4,51 @@ Test script for Android Emulator MCP Server.
 Tests basic functionality without running the full MCP protocol.
 """
 
+import functools
+import io
+import itertools
+import re
 import subprocess
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from xml.etree.ElementTree import iterparse
+
+# Matches the "1080x2400" in `wm size` output
+_WM_SIZE_RE = re.compile(r'(\d+)x(\d+)')
+
+
+@functools.lru_cache(maxsize=1)
+def _adb_version(adb_path):
+    """Run `adb version` once per adb binary; returns stdout, stderr, returncode."""
+    try:
+        result = subprocess.run(
+            [adb_path, "version"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=30
+        )
+        return result.stdout, result.stderr, result.returncode
+    except subprocess.TimeoutExpired:
+        return "", "Command timed out after 30s", 1
+    except Exception as e:
+        return "", str(e), 1
+
+
+class _BufferedStdout:
+    """sys.stdout stand-in that gives each worker thread its own output buffer."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+    
+    def write(self, text):
+        return getattr(self.local, "buffer", self.stream).write(text)
+    
+    def flush(self):
+        getattr(self.local, "buffer", self.stream).flush()
 
 
 class AndroidEmulatorTester:
@@ -15,32 +56,46 @@ class AndroidEmulatorTester:
     
     def __init__(self, adb_path="adb"):
         self.adb_path = adb_path
-        self.device_serial = None
-        
-    def run_adb(self, args, timeout=30):
-        """Execute ADB command."""
-        cmd = [self.adb_path]
-        if self.device_serial:
-            cmd.extend(["-s", self.device_serial])
-        cmd.extend(args)
+        self._device_info = {}
+        self._screen_size = None
+        self._set_device(None)
+        
+    def _set_device(self, serial):
+        """Select the device and rebuild the argv prefix used for adb calls."""
+        self.device_serial = serial
+        self._argv_prefix = [self.adb_path, "-s", serial] if serial else [self.adb_path]
+    
+    def run_adb_bytes(self, args, timeout=30):
+        """Execute ADB command, returning stdout as raw bytes."""
+        cmd = self._argv_prefix + args
         
         try:
             result = subprocess.run(
                 cmd,
-                capture_output=True,
-                text=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 timeout=timeout
             )
-            return result.stdout, result.stderr, result.returncode
+            return result.stdout, result.stderr.decode("utf-8", "replace"), result.returncode
         except subprocess.TimeoutExpired:
-            return "", f"Command timed out after {timeout}s", 1
+            return b"", f"Command timed out after {timeout}s", 1
         except Exception as e:
-            return "", str(e), 1
+            return b"", str(e), 1
+    
+    def run_adb(self, args, timeout=30):
+        """Execute ADB command."""
+        stdout, stderr, code = self.run_adb_bytes(args, timeout)
+        return stdout.decode("utf-8", "replace"), stderr, code
+    
+    def run_adb_batch(self, shell_commands, timeout=30):
+        """Run several shell commands in one adb shell invocation."""
+        return self.run_adb(["shell", "; ".join(shell_commands)], timeout)
     
     def test_adb_available(self):
         """Test if ADB is available."""
         print("Testing ADB availability...")
-        stdout, stderr, code = self.run_adb(["version"])
+        stdout, stderr, code = _adb_version(self.adb_path)
         
         if code == 0:
             print(f"✓ ADB is available")
@@ -59,8 +114,13 @@ class AndroidEmulatorTester:
             print(f"✗ Failed to list devices: {stderr}")
             return False
         
-        lines = stdout.strip().split("\n")[1:]
-        devices = [line.split()[0] for line in lines if line.strip() and "device" in line]
+        # Only count entries whose state is exactly "device" (not offline,
+        # unauthorized, ...); the header line never has that second token
+        devices = []
+        for line in stdout.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1] == "device":
+                devices.append(parts[0])
         
         if devices:
             print(f"✓ Found {len(devices)} device(s):")
@@ -68,7 +128,7 @@ class AndroidEmulatorTester:
                 print(f"  - {device}")
             
             # Select first device for testing
-            self.device_serial = devices[0]
+            self._set_device(devices[0])
             return True
         else:
             print("✗ No devices found")
@@ -79,29 +139,29 @@ class AndroidEmulatorTester:
         """Test getting device info."""
         print(f"\nTesting device info (device: {self.device_serial})...")
         
-        # Get model
-        stdout, _, code = self.run_adb(["shell", "getprop", "ro.product.model"])
-        if code == 0:
-            model = stdout.strip()
-            print(f"✓ Model: {model}")
-        
-        # Get Android version
-        stdout, _, code = self.run_adb(["shell", "getprop", "ro.build.version.release"])
-        if code == 0:
-            version = stdout.strip()
-            print(f"✓ Android version: {version}")
+        # Properties don't change during a run, so only ask the device once
+        info = self._device_info.get(self.device_serial)
+        if info is None:
+            stdout, _, code = self.run_adb_batch([
+                "getprop ro.product.model", "echo ---",
+                "getprop ro.build.version.release", "echo ---",
+                "getprop ro.build.version.sdk", "echo ---",
+                "wm size",
+            ])
+            if code != 0:
+                print("✗ Failed to read device info")
+                return False
+            
+            info = [value.strip() for value in stdout.split("---\n")]
+            self._device_info[self.device_serial] = info
         
-        # Get SDK version
-        stdout, _, code = self.run_adb(["shell", "getprop", "ro.build.version.sdk"])
-        if code == 0:
-            sdk = stdout.strip()
-            print(f"✓ SDK version: {sdk}")
+        for label, value in zip(["Model", "Android version", "SDK version", "Screen"], info):
+            print(f"✓ {label}: {value}")
         
-        # Get screen size
-        stdout, _, code = self.run_adb(["shell", "wm", "size"])
-        if code == 0:
-            size = stdout.strip()
-            print(f"✓ Screen: {size}")
+        # Remember the resolution for test_tap
+        match = _WM_SIZE_RE.search(info[-1])
+        if match:
+            self._screen_size = (int(match.group(1)), int(match.group(2)))
         
         return True
     
@@ -109,104 +169,86 @@ class AndroidEmulatorTester:
         """Test taking screenshot."""
         print("\nTesting screenshot capture...")
         
-        # Take screenshot on device
-        stdout, stderr, code = self.run_adb([
-            "shell", "screencap", "-p", "/sdcard/test_screenshot.png"
-        ])
+        # exec-out keeps the PNG bytes intact where `shell` could mangle
+        # line endings, and skips writing a copy to /sdcard
+        image, stderr, code = self.run_adb_bytes(["exec-out", "screencap", "-p"])
         
         if code != 0:
             print(f"✗ Failed to capture screenshot: {stderr}")
             return False
         
-        # Pull screenshot
         local_path = "/tmp/android_test_screenshot.png"
-        stdout, stderr, code = self.run_adb([
-            "pull", "/sdcard/test_screenshot.png", local_path
-        ])
+        Path(local_path).write_bytes(image)
         
-        if code != 0:
-            print(f"✗ Failed to pull screenshot: {stderr}")
-            return False
-        
-        # Check file exists
-        if Path(local_path).exists():
-            size = Path(local_path).stat().st_size
+        # Check we got an image
+        if image.startswith(b"\x89PNG\r\n\x1a\n"):
             print(f"✓ Screenshot captured successfully")
             print(f"  Saved to: {local_path}")
-            print(f"  Size: {size:,} bytes")
+            print(f"  Size: {len(image):,} bytes")
             return True
         else:
-            print("✗ Screenshot file not found")
+            print("✗ Screenshot is not a PNG image")
             return False
     
     def test_ui_hierarchy(self):
         """Test dumping UI hierarchy."""
         print("\nTesting UI hierarchy dump...")
         
-        # Dump UI
-        stdout, stderr, code = self.run_adb([
-            "shell", "uiautomator", "dump", "/sdcard/ui_dump.xml"
+        # Dump to a device file and cat it back in one adb call; /dev/fd/1
+        # can't be reopened when stdout is a socket, as it is over adb
+        stdout, stderr, code = self.run_adb_bytes([
+            "shell",
+            "uiautomator dump /data/local/tmp/ui_test.xml >/dev/null"
+            " && cat /data/local/tmp/ui_test.xml"
         ])
         
-        if code != 0:
-            print(f"✗ Failed to dump UI: {stderr}")
-            return False
-        
-        # Pull dump
-        local_path = "/tmp/android_ui_dump.xml"
-        stdout, stderr, code = self.run_adb([
-            "pull", "/sdcard/ui_dump.xml", local_path
-        ])
+        # Trim anything around the XML document
+        start = stdout.find(b"<?xml")
+        end = stdout.rfind(b">") + 1
         
-        if code != 0:
-            print(f"✗ Failed to pull UI dump: {stderr}")
+        if code != 0 or start < 0:
+            print(f"✗ Failed to dump UI: {stderr or stdout.decode('utf-8', 'replace').strip()}")
             return False
         
-        # Parse and show some info
-        if Path(local_path).exists():
-            import xml.etree.ElementTree as ET
-            tree = ET.parse(local_path)
-            root = tree.getroot()
-            
-            # Count elements
-            element_count = len(list(root.iter()))
-            
-            # Find some interesting elements
-            buttons = [e for e in root.iter() if e.get('class') == 'android.widget.Button']
-            texts = [e for e in root.iter() if e.get('class') == 'android.widget.TextView']
-            
-            print(f"✓ UI hierarchy dumped successfully")
-            print(f"  Total elements: {element_count}")
-            print(f"  Buttons: {len(buttons)}")
-            print(f"  TextViews: {len(texts)}")
-            return True
-        else:
-            print("✗ UI dump file not found")
-            return False
+        # Count and classify elements in one streaming pass
+        counts = {"total": 0, "android.widget.Button": 0, "android.widget.TextView": 0}
+        for _, elem in iterparse(io.BytesIO(stdout[start:end])):
+            counts["total"] += 1
+            cls = elem.get('class')
+            if cls in counts:
+                counts[cls] += 1
+            elem.clear()
+        
+        print(f"✓ UI hierarchy dumped successfully")
+        print(f"  Total elements: {counts['total']}")
+        print(f"  Buttons: {counts['android.widget.Button']}")
+        print(f"  TextViews: {counts['android.widget.TextView']}")
+        return True
     
     def test_tap(self):
         """Test tapping."""
         print("\nTesting tap input...")
         
         # Tap at center of screen
-        stdout, stderr, code = self.run_adb(["shell", "wm", "size"])
-        if code == 0:
-            import re
-            match = re.search(r'(\d+)x(\d+)', stdout)
+        if self._screen_size is None:
+            stdout, stderr, code = self.run_adb(["shell", "wm", "size"])
+            match = _WM_SIZE_RE.search(stdout) if code == 0 else None
             if match:
-                width = int(match.group(1))
-                height = int(match.group(2))
-                
-                center_x = width // 2
-                center_y = height // 2
-                
-                stdout, stderr, code = self.run_adb([
-                    "shell", "input", "tap", str(center_x), str(center_y)
-                ])
-                
-                if code == 0:
-                    print(f"✓ Tapped at ({center_x}, {center_y})")
-                    return True
+                self._screen_size = (int(match.group(1)), int(match.group(2)))
+        
+        if self._screen_size:
+            width, height = self._screen_size
+            
+            center_x = width // 2
+            center_y = height // 2
+            
+            stdout, stderr, code = self.run_adb([
+                "shell", "input", "tap", str(center_x), str(center_y)
+            ])
+            
+            if code == 0:
+                print(f"✓ Tapped at ({center_x}, {center_y})")
+                return True
         
         print("✗ Failed to tap")
         return False
@@ -235,11 +277,12 @@ class AndroidEmulatorTester:
             print(f"✗ Failed to list packages: {stderr}")
             return False
         
-        packages = [line.replace("package:", "") for line in stdout.strip().split("\n")]
+        # Only the first few names are shown, so don't build the full list
+        packages = (line[8:] for line in stdout.splitlines() if line.startswith("package:"))
         
-        print(f"✓ Found {len(packages)} installed packages")
+        print(f"✓ Found {stdout.count('package:')} installed packages")
         print(f"  Sample packages:")
-        for pkg in packages[:5]:
+        for pkg in itertools.islice(packages, 5):
             print(f"    - {pkg}")
         
         return True
@@ -296,42 +339,75 @@ class AndroidEmulatorTester:
             print("✗ File content mismatch")
             return False
     
+    def _run_test(self, name, test_func, needs_device=True):
+        """Run one test; returns True, False or "skipped"."""
+        try:
+            # Skip tests after device listing if no device
+            if needs_device and not self.device_serial:
+                print(f"\n⊘ Skipping {name} (no device available)")
+                return "skipped"
+            
+            return test_func()
+        except Exception as e:
+            print(f"\n✗ {name} failed with exception: {e}")
+            return False
+    
     def run_all_tests(self):
         """Run all tests."""
         print("="*60)
         print("Android Emulator MCP Server - Functionality Test")
         print("="*60)
         
-        tests = [
+        setup_tests = [
             ("ADB Available", self.test_adb_available),
             ("List Devices", self.test_list_devices),
+        ]
+        
+        # Read-only checks that can run side by side
+        independent_tests = [
             ("Device Info", self.test_device_info),
             ("Screenshot", self.test_screenshot),
             ("UI Hierarchy", self.test_ui_hierarchy),
-            ("Tap Input", self.test_tap),
-            ("Key Press", self.test_key_press),
             ("App Listing", self.test_app_list),
             ("Shell Commands", self.test_shell_command),
+        ]
+        
+        # Tests that change device state run one at a time afterwards
+        mutating_tests = [
+            ("Tap Input", self.test_tap),
+            ("Key Press", self.test_key_press),
             ("File Operations", self.test_file_operations),
         ]
         
         results = {}
         
-        for name, test_func in tests:
+        for name, test_func in setup_tests:
+            results[name] = self._run_test(name, test_func, needs_device=False)
+        
+        # Buffer each parallel test's output and print it in order once done
+        stdout = sys.stdout
+        buffered = _BufferedStdout(stdout)
+        
+        def run_buffered(test):
+            buffered.local.buffer = io.StringIO()
             try:
-                # Skip tests after device listing if no device
-                if name != "ADB Available" and name != "List Devices":
-                    if not self.device_serial:
-                        print(f"\n⊘ Skipping {name} (no device available)")
-                        results[name] = "skipped"
-                        continue
-                
-                results[name] = test_func()
-            except Exception as e:
-                print(f"\n✗ {name} failed with exception: {e}")
-                results[name] = False
-            
-            time.sleep(0.5)  # Brief pause between tests
+                return self._run_test(*test), buffered.local.buffer.getvalue()
+            finally:
+                del buffered.local.buffer
+        
+        sys.stdout = buffered
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                outcomes = list(pool.map(run_buffered, independent_tests))
+        finally:
+            sys.stdout = stdout
+        
+        for (name, _), (result, output) in zip(independent_tests, outcomes):
+            print(output, end="")
+            results[name] = result
+        
+        for name, test_func in mutating_tests:
+            results[name] = self._run_test(name, test_func)
         
         # Print summary
         print("\n" + "="*60)